@@ -0,0 +1,44 @@
+# ===== RUN THE INDEPENDENT CSV INGESTS SIDE BY SIDE ===== #
+# Each file goes to its own table, so the four loads don't touch each other.
+# Every worker process runs a script's main() and opens its own MySQL connection.
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import ingest_csv_file_to_mysql_heat_vulerabilitity_index_ranking as heat_vulnerability
+import ingest_csv_to_mysql_1995 as census_1995
+import ingest_csv_to_mysql_2005 as census_2005
+import ingest_csv_to_mysql_2015 as census_2015
+
+# ==== USER SETTINGS ====
+MAX_WORKERS = 4
+# =======================
+
+# name -> (script main, csv it loads)
+JOBS = {
+    "heat_vulnerability": (heat_vulnerability.main, heat_vulnerability.CSV_PATH),
+    "street_trees_1995": (census_1995.main, census_1995.CSV_PATH),
+    "street_trees_2005": (census_2005.main, census_2005.CSV_PATH),
+    "street_trees_2015": (census_2015.main, census_2015.CSV_PATH),
+}
+
+
+def main():
+    failed = []
+    with ProcessPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        futures = {pool.submit(fn, csv_path): name for name, (fn, csv_path) in JOBS.items()}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                future.result()
+                print(f"✅ {name} finished")
+            except Exception as e:
+                failed.append(name)
+                print(f"❌ {name} failed: {e}")
+
+    if failed:
+        raise SystemExit(f"{len(failed)} ingest(s) failed: {', '.join(failed)}")
+    print("All ingests finished.")
+
+
+if __name__ == "__main__":
+    main()
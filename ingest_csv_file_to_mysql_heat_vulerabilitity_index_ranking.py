@@ -1,20 +1,20 @@
 # ===== PYTHON FILE TO EXPORT CSV FILE DATA TO DATABASE  ===== #
 
-import math
-import re
-import pandas as pd
-import numpy as np
+from pandas.api.types import is_string_dtype
 import mysql.connector
 from mysql.connector import errorcode
 from pathlib import Path
 from config import DB_CONFIG  # expects: host, port, user, password, database
-from src.ingest_csv_to_mysql_2015 import FILE_NAME_FOR_PROVENANCE
+from ingest_helpers import (bulk_insert, drop_indexes, load_data_local, max_allowed_packet,
+                            prepare_session, read_csv_chunks, rebuild_indexes, restore_session,
+                            log, PROGRESS_EVERY)
 
 # ==== USER SETTINGS ====
 CSV_PATH = Path(__file__).resolve().parent.parent / "data" / "Heat_Vulnerability_Index_Rankings_20251018 copy.csv"
 TABLE = "heat_vulnerability_index_rankings"
-BATCH_SIZE = 10
-FILE_NAME_FOR_PROVENANCE = CSV_PATH.name
+BATCH_SIZE = 50000
+LOAD_DATA_LOCAL = False  # True -> LOAD DATA LOCAL INFILE per chunk (server needs local_infile=ON)
+DROP_INDEXES_DURING_LOAD = ()  # e.g. ("idx_zip",): dropped before the load, rebuilt after as they were
 # =======================
 
 # Columns for database
@@ -27,20 +27,11 @@ def normalize_headers(cols):
     # Lowercase + spaces -> underscores (matches our SRC_COLUMNS)
     return [c.strip().lower().replace(" ", "_") for c in cols]
 
-def main ():
-    if not Path(CSV_PATH).exists():
-        raise FileNotFoundError(f"CSV not found at {CSV_PATH.resolve()}")
-
-    # == reads the csv file using read_csv method from pandas
-    # == also makes all columns lowercase to make seemless transition of information easy
-    df = pd.read_csv(CSV_PATH, dtype=str, keep_default_na=True, na_values=["", "NA", "N/A"])
+# == cleans one chunk of the csv file, columns in insert order
+def transform(df, file_name):
+    # == makes all columns lowercase to make seemless transition of information easy
     df.columns = normalize_headers(df.columns)
 
-    # == excludes the id column within the table
-    # == similar to skipping over
-    if "id" in df.columns:
-        df = df.drop(columns=["id"])
-
     # == check if all columns are present
     # == translates for loop into simple one liner code
     expected_without_file = [c for c in INSERT_COLUMNS if c != "file_name"]
@@ -49,24 +40,28 @@ def main ():
         print("CSV columns after normalization:", list(df.columns))
         raise ValueError(f"Your CSV is missing these columns: {missing}")
 
-    df["file_name"] = FILE_NAME_FOR_PROVENANCE
+    # == keeps only the columns we insert (drops id and everything else)
+    # == before cleaning, so the strip below doesn't touch them
+    df = df[expected_without_file]
 
-    # == similar to the regular map function
-    df = df.applymap(lambda x: x.strip() if isinstance(x, str) else x)
+    # == trims whitespace column by column (vectorized .str, not per cell)
+    df = df.apply(lambda s: s.str.strip() if is_string_dtype(s.dtype) else s)
+
+    df["file_name"] = file_name
 
     # == applies the lambda function to
     df = df[INSERT_COLUMNS]
 
-    records = df.where(pd.notnull(df), None).values.tolist()
-    total = len(records)
-    print(f"Prepared {total} rows from {CSV_PATH}")
+    return df
 
-    # == inserts values into the table's columns
-    placeholders = ", ".join(["%s"] * len(INSERT_COLUMNS))
-    col_list = ", ".join(INSERT_COLUMNS)
-    insert_sql = f"INSERT INTO {TABLE} ({col_list}) VALUES ({placeholders})"
+def main(csv_path=CSV_PATH):
+    csv_path = Path(csv_path)
+    if not csv_path.exists():
+        raise FileNotFoundError(f"CSV not found at {csv_path.resolve()}")
 
     # == connecting to mysql server using config py file
+    cnx = cur = ins = None
+    dropped = {}
     try:
         cnx = mysql.connector.connect(
             host=DB_CONFIG["host"],
@@ -74,27 +69,48 @@ def main ():
             user=DB_CONFIG["user"],
             password=DB_CONFIG["password"],
             database=DB_CONFIG["database"],
-            autocommit=False
+            autocommit=False,
+            allow_local_infile=LOAD_DATA_LOCAL,
+            use_pure=False  # C extension (libmysqlclient), not the pure-Python protocol
         )
         cur = cnx.cursor()
+        # == prepared cursor for the inserts: parsed once by the server, then only fed parameters
+        ins = cnx.cursor(prepared=True)
+        # == bulk-load session: skip per-row unique / foreign key checks
+        prepare_session(cur)
+        # == server packet limit, so one INSERT statement never outgrows it
+        packet = max_allowed_packet(cur)
+        # == takes secondary indexes off for the load, they are rebuilt once in finally
+        dropped = drop_indexes(cur, TABLE, DROP_INDEXES_DURING_LOAD)
+
+        # == reads the csv file one BATCH_SIZE chunk at a time (pyarrow when installed)
+        # == each chunk is cleaned and inserted before the next one is read
+        reader = read_csv_chunks(csv_path, BATCH_SIZE)
+        total = 0
+        for b, chunk in enumerate(reader):
+            df = transform(chunk, csv_path.name)
+            start, end = total, total + len(df)
+            if b % PROGRESS_EVERY == 0:
+                log.info("Inserting rows %d..%d (%d rows)", start, end - 1, len(df))
+            try:
+                if LOAD_DATA_LOCAL:
+                    load_data_local(cur, TABLE, INSERT_COLUMNS, df)
+                else:
+                    rows = df.to_numpy(dtype=object, na_value=None).tolist()
+                    bulk_insert(ins, TABLE, INSERT_COLUMNS, rows, BATCH_SIZE, packet)
+            except Exception as e:
+                cnx.rollback()
+                print(f"Batch {b + 1} failed on rows {start}-{end - 1}: {e}")
+                raise
+            total = end
+
+        # == one commit for the whole file (a failed batch rolls everything back)
+        cnx.commit()
 
         if total == 0:
             print("Nothing to insert.")
         else:
-            batches = math.ceil(total / BATCH_SIZE)
-            start = 0
-            for b in range(batches):
-                end = min(start + BATCH_SIZE, total)
-                batch = records[start:end]
-                print(f"Inserting rows {start}..{end - 1} ({len(batch)} rows)")
-                try:
-                    cur.executemany(insert_sql, batch)
-                    cnx.commit()
-                except Exception as e:
-                    cnx.rollback()
-                    print(f"Batch {b + 1}/{batches} failed on rows {start}-{end - 1}: {e}")
-                    raise
-                start = end
+            print(f"Inserted {total} rows from {csv_path}")
 
         cur.execute(f"SELECT COUNT(*) FROM {TABLE}")
         count, = cur.fetchone()
@@ -111,14 +127,21 @@ def main ():
             print(f"MySQL error: {err}")
         raise
     finally:
-        try:
-            cnx.close()
-        except Exception:
-            pass
-        try:
+        # == closes each handle once, only if it was actually opened
+        if ins is not None:
+            ins.close()
+        if cur is not None:
+            try:
+                rebuild_indexes(cur, TABLE, dropped)
+            except mysql.connector.Error as e:
+                print(f"Index rebuild on {TABLE} failed, re-create {list(dropped)} by hand: {e}")
+            try:
+                restore_session(cur)
+            except mysql.connector.Error:
+                pass
+            cur.close()
+        if cnx is not None:
             cnx.close()
-        except Exception:
-            pass
 
 # == runs main function
 if __name__ == "__main__":
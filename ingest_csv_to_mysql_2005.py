@@ -1,19 +1,23 @@
 # ===== PYTHON QUERY TO IMPORT DATA FROM 2005 CSV FILE INTO MYSQL (with health_3cat) ===== #
 # ===== 2005 SQL TABLE HAS ALL ROWS IMPORTED ALONGSIDE GEOM UPDATE ======= #
 
-import math
-import re
 import pandas as pd
+from pandas.api.types import is_string_dtype
 import numpy as np
 import mysql.connector
 from mysql.connector import errorcode
 from pathlib import Path
 from config import DB_CONFIG  # host, port, user, password, database
+from ingest_helpers import (bulk_insert, drop_indexes, load_data_local, max_allowed_packet,
+                            prepare_session, read_csv_chunks, rebuild_indexes, restore_session,
+                            log, PROGRESS_EVERY)
 
 # ==== USER SETTINGS ====
 CSV_PATH = Path(__file__).resolve().parent.parent / "data" / "2005_Street_Tree_Census_20251014 copy.csv"
 TABLE = "nyc_open_source_database_2005"
 BATCH_SIZE = 10000
+LOAD_DATA_LOCAL = False  # True -> LOAD DATA LOCAL INFILE per chunk (server needs local_infile=ON)
+DROP_INDEXES_DURING_LOAD = ()  # e.g. ("idx_zip",): dropped before the load, rebuilt after as they were
 # =======================
 
 # Columns to insert (exclude auto-increment 'objectid')
@@ -50,6 +54,9 @@ SRC_COLUMNS = [
     "latitude","longitude","x_sp","y_sp","objectid_1","census_tract","bin","bbl","location_1"
 ]
 
+# Source columns actually loaded (CSV's own objectid is dropped; DB auto_increment)
+SRC_COLUMNS_USED = [c for c in SRC_COLUMNS if c != "objectid"]
+
 # Column groups for conversions
 BOOL_COLS = [
     "vert_other","vert_pgrd","vert_tgrd","vert_wall",
@@ -67,51 +74,46 @@ YEAR_COLS = ["cen_year"]
 def normalize_headers(cols):
     return [c.strip().lower().replace(" ", "_") for c in cols]
 
+# Plain pattern strings: Arrow-backed .str methods don't take compiled regexes
+_STRIP_PAT = r"[,\s]"
+_INT_PAT = r"-?\d+"
+
+BOOL_MAP = {
+    "y": 1, "yes": 1, "1": 1, "true": 1, "t": 1,
+    "n": 0, "no": 0, "0": 0, "false": 0, "f": 0,
+}
+
+# Converters take and return a whole column (Series) so the work runs in
+# pandas' vectorized string/numeric kernels instead of once per cell.
 def to_bool(s):
-    if s is None: return None
-    t = str(s).strip().lower()
-    if t in {"y","yes","1","true","t"}: return 1
-    if t in {"n","no","0","false","f"}: return 0
-    return None
+    return s.str.strip().str.lower().map(BOOL_MAP).astype("Int64")
 
 def to_int(s):
-    if s is None: return None
-    t = re.sub(r"[,\s]", "", str(s))
-    return int(t) if t != "" and re.fullmatch(r"-?\d+", t) else None
+    t = s.str.replace(_STRIP_PAT, "", regex=True)
+    t = t.where(t.str.fullmatch(_INT_PAT, na=False))
+    return pd.to_numeric(t).astype("Int64")
 
 def to_int_bounded(s, low=0, high=400):
     v = to_int(s)
-    if v is None: return None
-    return v if (low <= v <= high) else None
+    return v.where(v.between(low, high))
 
 def to_dec(s):
-    if s is None: return None
-    t = re.sub(r"[,\s]", "", str(s))
-    try:
-        return float(t) if t != "" else None
-    except ValueError:
-        return None
+    t = s.str.replace(_STRIP_PAT, "", regex=True)
+    return pd.to_numeric(t, errors="coerce").astype("float64")
 
 def to_year(s):
-    v = to_int(s)
-    return v if v is not None else None
+    return to_int(s)
 
 # === NEW: map 2005 status -> normalized 3-bucket health ===
 # Your rule: Excellent -> Good, Good -> Fair, Poor/Dead/Fair -> Poor
-def status_to_health_3cat(s):
-    if s is None: return None
-    t = str(s).strip().lower()
-    if t in {"excellent", "e"}: return "Good"
-    if t in {"good", "g"}:     return "Fair"
-    if t in {"poor", "p", "dead", "d", "fair", "f"}: return "Poor"
-    return None
-
-def main():
-    if not CSV_PATH.exists():
-        raise FileNotFoundError(f"CSV not found at: {CSV_PATH.resolve()}")
-
-    # Read CSV and normalize headers
-    df = pd.read_csv(CSV_PATH, dtype=str, keep_default_na=True, na_values=["", "NA", "N/A"])
+HEALTH_MAP = {
+    "excellent": "Good", "e": "Good",
+    "good": "Fair", "g": "Fair",
+    "poor": "Poor", "p": "Poor", "dead": "Poor", "d": "Poor", "fair": "Poor", "f": "Poor",
+}
+
+# Clean one CSV chunk; columns come back in insert order
+def transform(df, file_name):
     df.columns = normalize_headers(df.columns)
 
     # Validate columns
@@ -120,49 +122,53 @@ def main():
         print("CSV columns after normalization:", list(df.columns))
         raise ValueError(f"CSV missing expected columns: {missing}")
 
-    # Drop CSV's own objectid (DB auto_increment)
-    if "objectid" in df.columns:
-        df = df.drop(columns=["objectid"])
+    # Keep only the columns we insert, before any per-column cleaning
+    df = df[SRC_COLUMNS_USED]
 
-    # Trim whitespace
-    df = df.applymap(lambda x: x.strip() if isinstance(x, str) else x)
+    # Trim whitespace (vectorized per column)
+    df = df.apply(lambda s: s.str.strip() if is_string_dtype(s.dtype) else s)
 
     # Type conversions
     for c in BOOL_COLS:
-        if c in df: df[c] = df[c].map(to_bool)
+        if c in df: df[c] = to_bool(df[c])
 
     for c in INT_COLS:
         if c == "tree_dbh":
-            df[c] = df[c].map(lambda x: to_int_bounded(x, 0, 400))
+            df[c] = to_int_bounded(df[c], 0, 400)
         else:
-            df[c] = df[c].map(to_int)
+            df[c] = to_int(df[c])
 
     for c in DEC_COLS:
-        if c in df: df[c] = df[c].map(to_dec)
+        if c in df: df[c] = to_dec(df[c])
 
     for c in YEAR_COLS:
-        if c in df: df[c] = df[c].map(to_year)
+        if c in df: df[c] = to_year(df[c])
 
     # Provenance + normalized health
-    df["file_name"] = CSV_PATH.name
-    df["health_3cat"] = df["status"].map(status_to_health_3cat)
+    df["file_name"] = file_name
+    df["health_3cat"] = df["status"].str.strip().str.lower().map(HEALTH_MAP)
 
     # Reorder to match insert columns
     df = df[INSERT_COLUMNS]
 
-    # Robust NaN cleanup -> None
-    df = df.replace({np.nan: None, np.inf: None, -np.inf: None, "nan": None, "NaN": None})
-    df = df.applymap(lambda x: None if (x == "" or str(x).lower() == "nan") else x)
+    # Robust NaN cleanup: one null mask (NaN, +/-inf, "" / "nan" in any case)
+    str_cols = df.select_dtypes(include=["object", "string"]).columns
+    dec_cols = df.select_dtypes(include="float").columns
+    null_mask = df.isna()
+    null_mask[str_cols] |= df[str_cols].apply(lambda s: s.str.lower().isin(["", "nan"]))
+    null_mask[dec_cols] |= np.isinf(df[dec_cols])
+    df = df.mask(null_mask)
 
-    records = df.astype(object).where(pd.notnull(df), None).values.tolist()
-    total = len(records)
-    print(f"Prepared {total:,} rows from {CSV_PATH.name}")
+    return df
 
-    placeholders = ", ".join(["%s"] * len(INSERT_COLUMNS))
-    col_list = ", ".join(INSERT_COLUMNS)
-    insert_sql = f"INSERT INTO {TABLE} ({col_list}) VALUES ({placeholders})"
+def main(csv_path=CSV_PATH):
+    csv_path = Path(csv_path)
+    if not csv_path.exists():
+        raise FileNotFoundError(f"CSV not found at: {csv_path.resolve()}")
 
     # Insert batches
+    cnx = cur = ins = None
+    dropped = {}
     try:
         cnx = mysql.connector.connect(
             host=DB_CONFIG["host"],
@@ -171,28 +177,46 @@ def main():
             password=DB_CONFIG["password"],
             database=DB_CONFIG["database"],
             autocommit=False,
+            allow_local_infile=LOAD_DATA_LOCAL,
+            use_pure=False,  # C extension (libmysqlclient), not the pure-Python protocol
             charset="utf8mb4",
             use_unicode=True
         )
         cur = cnx.cursor()
+        ins = cnx.cursor(prepared=True)  # server-side prepared INSERT (see bulk_insert)
+        # Bulk-load session: skip per-row unique / foreign key checks
+        prepare_session(cur)
+        packet = max_allowed_packet(cur)  # caps rows per INSERT statement
+        # Secondary indexes come off for the load and are rebuilt once in finally
+        dropped = drop_indexes(cur, TABLE, DROP_INDEXES_DURING_LOAD)
+
+        # Stream the CSV: read, clean and insert one BATCH_SIZE chunk at a time
+        reader = read_csv_chunks(csv_path, BATCH_SIZE)
+        total = 0
+        for b, chunk in enumerate(reader):
+            df = transform(chunk, csv_path.name)
+            start, end = total, total + len(df)
+            if b % PROGRESS_EVERY == 0:
+                log.info("Inserting rows %d..%d (%d rows)", start, end - 1, len(df))
+            try:
+                if LOAD_DATA_LOCAL:
+                    load_data_local(cur, TABLE, INSERT_COLUMNS, df)
+                else:
+                    rows = df.to_numpy(dtype=object, na_value=None).tolist()
+                    bulk_insert(ins, TABLE, INSERT_COLUMNS, rows, BATCH_SIZE, packet)
+            except Exception as e:
+                cnx.rollback()
+                print(f"Batch {b+1} failed ({start}-{end-1}): {e}")
+                raise
+            total = end
+
+        # One commit for the whole file (a failed batch rolls everything back)
+        cnx.commit()
 
         if total == 0:
             print("Nothing to insert.")
         else:
-            batches = math.ceil(total / BATCH_SIZE)
-            start = 0
-            for b in range(batches):
-                end = min(start + BATCH_SIZE, total)
-                batch = records[start:end]
-                print(f"Inserting rows {start}..{end-1} ({len(batch)} rows)")
-                try:
-                    cur.executemany(insert_sql, batch)
-                    cnx.commit()
-                except Exception as e:
-                    cnx.rollback()
-                    print(f"Batch {b+1}/{batches} failed ({start}-{end-1}): {e}")
-                    raise
-                start = end
+            print(f"Inserted {total:,} rows from {csv_path.name}")
 
         cur.execute(f"SELECT COUNT(*) FROM {TABLE}")
         (count,) = cur.fetchone()
@@ -211,10 +235,21 @@ def main():
             print(f"MySQL error: {err}")
         raise
     finally:
-        try: cur.close()
-        except: pass
-        try: cnx.close()
-        except: pass
+        # Only rebuild, restore and close what was actually opened
+        if ins is not None:
+            ins.close()
+        if cur is not None:
+            try:
+                rebuild_indexes(cur, TABLE, dropped)
+            except mysql.connector.Error as e:
+                print(f"Index rebuild on {TABLE} failed, re-create {list(dropped)} by hand: {e}")
+            try:
+                restore_session(cur)
+            except mysql.connector.Error:
+                pass
+            cur.close()
+        if cnx is not None:
+            cnx.close()
 
 if __name__ == "__main__":
     main()
@@ -1,13 +1,15 @@
 # ====== 2015 TABLE HAS ALL NECESSARY INFORMATION ========= #
 
-import math
 import pandas as pd
+from pandas.api.types import is_string_dtype
 import mysql.connector
 from mysql.connector import errorcode
 from pathlib import Path
-from datetime import datetime
 
 from config import DB_CONFIG  # expects host, port, user, password, database
+from ingest_helpers import (bulk_insert, drop_indexes, load_data_local, max_allowed_packet,
+                            prepare_session, read_csv_chunks, rebuild_indexes, restore_session,
+                            log, PROGRESS_EVERY)
 
 # ==== USER SETTINGS ====
 # creates a path inside MacBook 'Finder' to 'find' the folder containing the CSV file
@@ -15,7 +17,8 @@ from config import DB_CONFIG  # expects host, port, user, password, database
 CSV_PATH = Path(__file__).resolve().parent.parent / "data" / "2015_Street_Tree_Census_-_Tree_Data_20251014_copy.csv"
 TABLE = "nyc_open_source_database_2015"
 BATCH_SIZE = 10000
-FILE_NAME_FOR_PROVENANCE = CSV_PATH.name
+LOAD_DATA_LOCAL = False  # True -> LOAD DATA LOCAL INFILE per chunk (server needs local_infile=ON)
+DROP_INDEXES_DURING_LOAD = ()  # e.g. ("idx_zip",): dropped before the load, rebuilt after as they were
 # ========================
 
 # generate all columns that will be used in DBeaver
@@ -33,70 +36,56 @@ INSERT_COLUMNS = [
     "council_district", "census_tract", "bin", "bbl", "file_name"
 ]
 
+# CSV columns read from the file (health_3cat and file_name are derived)
+SRC_COLUMNS = [c for c in INSERT_COLUMNS if c not in ("health_3cat", "file_name")]
+
 # function that standardizes all columns to certain requirements
 def normalize_headers(cols):
     return [c.strip().lower().replace(" ", "_") for c in cols]
 
 # === Parse 2015 dates like 8/27/15 into ISO YYYY-MM-DD ===
+# Formats are tried in order; the first one that parses a value wins
+DATE_FORMATS = ("%Y-%m-%d", "%m/%d/%Y", "%m/%d/%y", "%m-%d-%Y", "%m-%d-%y")
+
 def to_iso_date(s):
-    if s is None:
-        return None
-    t = str(s).strip()
-    if t == "" or t.lower() in {"na", "n/a", "null"}:
-        return None
-    for fmt in ("%Y-%m-%d", "%m/%d/%Y", "%m/%d/%y", "%m-%d-%Y", "%m-%d-%y"):
-        try:
-            return datetime.strptime(t, fmt).date().isoformat()
-        except ValueError:
-            continue
-    return None
+    t = s.str.strip()
+    t = t.mask(t.isin(["now", "today"]))  # to_datetime would read these as the current date
+    parsed = pd.Series(pd.NaT, index=s.index, dtype="datetime64[ns]")
+    for fmt in DATE_FORMATS:
+        todo = parsed.isna() & t.notna()
+        if not todo.any():
+            break
+        parsed[todo] = pd.to_datetime(t[todo], format=fmt, errors="coerce")
+    return parsed.dt.strftime("%Y-%m-%d")
 
 # === Normalize health to 3-category ===
-def health_to_health_3cat(s):
-    if s is None:
-        return None
-    t = str(s).strip().lower()
-    if t == "good": return "Good"
-    if t == "fair": return "Fair"
-    if t == "poor": return "Poor"
-    return None
-
-def main():
-    if not CSV_PATH.exists():
-        raise FileNotFoundError(f"CSV not found at: {CSV_PATH.resolve()}")
-
-    # 1) Read CSV
-    df = pd.read_csv(CSV_PATH, dtype=str, keep_default_na=True, na_values=["", "NA", "N/A"])
-    df.columns = normalize_headers(df.columns)
-
-    # 2) Drop id if present
-    if "id" in df.columns:
-        df = df.drop(columns=["id"])
+HEALTH_MAP = {"good": "Good", "fair": "Fair", "poor": "Poor"}
 
-    # 3) Parse date + normalize health
-    df["created_at"] = df["created_at"].map(to_iso_date)
-    df["health_3cat"] = df["health"].map(health_to_health_3cat)  # Normalizing the health values
-    df["file_name"] = FILE_NAME_FOR_PROVENANCE
+# Clean one CSV chunk; columns come back in insert order
+def transform(df, file_name):
+    df.columns = normalize_headers(df.columns)
 
-    # 4) Trim whitespace
-    df = df.applymap(lambda x: x.strip() if isinstance(x, str) else x)
+    # 1) Keep only the columns we load (drops id and the rest up front)
+    df = df[SRC_COLUMNS]
 
-    # 5) Order columns
-    df = df[INSERT_COLUMNS]
+    # 2) Trim whitespace (vectorized per column)
+    df = df.apply(lambda s: s.str.strip() if is_string_dtype(s.dtype) else s)
 
-    # 6) Replace NaN/None
-    df = df.where(pd.notnull(df), None)
+    # 3) Parse date + normalize health
+    df["created_at"] = to_iso_date(df["created_at"])
+    df["health_3cat"] = df["health"].str.strip().str.lower().map(HEALTH_MAP)  # Normalizing the health values
+    df["file_name"] = file_name
 
-    # 7) Convert to records
-    records = df.values.tolist()
-    total = len(records)
-    print(f"Prepared {total:,} rows from {CSV_PATH.name}")
+    # 4) Order columns
+    return df[INSERT_COLUMNS]
 
-    # 8) Build INSERT
-    placeholders = ", ".join(["%s"] * len(INSERT_COLUMNS))
-    col_list = ", ".join(f"`{c}`" for c in INSERT_COLUMNS)
-    insert_sql = f"INSERT INTO {TABLE} ({col_list}) VALUES ({placeholders})"
+def main(csv_path=CSV_PATH):
+    csv_path = Path(csv_path)
+    if not csv_path.exists():
+        raise FileNotFoundError(f"CSV not found at: {csv_path.resolve()}")
 
+    cnx = cur = ins = None
+    dropped = {}
     try:
         cnx = mysql.connector.connect(
             host=DB_CONFIG["host"],
@@ -104,25 +93,45 @@ def main():
             user=DB_CONFIG["user"],
             password=DB_CONFIG["password"],
             database=DB_CONFIG["database"],
-            autocommit=False
+            autocommit=False,
+            allow_local_infile=LOAD_DATA_LOCAL,
+            use_pure=False  # C extension (libmysqlclient), not the pure-Python protocol
         )
         cur = cnx.cursor()
+        ins = cnx.cursor(prepared=True)  # server-side prepared INSERT (see bulk_insert)
+        # Bulk-load session: skip per-row unique / foreign key checks
+        prepare_session(cur)
+        packet = max_allowed_packet(cur)  # caps rows per INSERT statement
+        # Secondary indexes come off for the load and are rebuilt once in finally
+        dropped = drop_indexes(cur, TABLE, DROP_INDEXES_DURING_LOAD)
+
+        # Stream the CSV: read, clean and insert one BATCH_SIZE chunk at a time
+        reader = read_csv_chunks(csv_path, BATCH_SIZE)
+        total = 0
+        for b, chunk in enumerate(reader):
+            df = transform(chunk, csv_path.name)
+            start, end = total, total + len(df)
+            if b % PROGRESS_EVERY == 0:
+                log.info("Inserting rows %d..%d (%d rows)", start, end - 1, len(df))
+            try:
+                if LOAD_DATA_LOCAL:
+                    load_data_local(cur, TABLE, INSERT_COLUMNS, df)
+                else:
+                    rows = df.to_numpy(dtype=object, na_value=None).tolist()
+                    bulk_insert(ins, TABLE, INSERT_COLUMNS, rows, BATCH_SIZE, packet)
+            except Exception as e:
+                cnx.rollback()
+                print(f"Batch {b + 1} failed ({start}-{end - 1}): {e}")
+                raise
+            total = end
+
+        # One commit for the whole file (a failed batch rolls everything back)
+        cnx.commit()
 
         if total == 0:
             print("Nothing to insert.")
         else:
-            batches = math.ceil(total / BATCH_SIZE)
-            for b in range(batches):
-                start, end = b * BATCH_SIZE, min((b + 1) * BATCH_SIZE, total)
-                batch = records[start:end]
-                print(f"Inserting rows {start}..{end - 1} ({len(batch)} rows)")
-                try:
-                    cur.executemany(insert_sql, batch)
-                    cnx.commit()
-                except Exception as e:
-                    cnx.rollback()
-                    print(f"Batch {b + 1}/{batches} failed ({start}-{end - 1}): {e}")
-                    raise
+            print(f"Inserted {total:,} rows from {csv_path.name}")
 
         # Validation
         cur.execute(f"SELECT COUNT(*) FROM {TABLE}")
@@ -141,10 +150,21 @@ def main():
             print(f"MySQL error: {err}")
         raise
     finally:
-        try: cur.close()
-        except: pass
-        try: cnx.close()
-        except: pass
+        # Only rebuild, restore and close what was actually opened
+        if ins is not None:
+            ins.close()
+        if cur is not None:
+            try:
+                rebuild_indexes(cur, TABLE, dropped)
+            except mysql.connector.Error as e:
+                print(f"Index rebuild on {TABLE} failed, re-create {list(dropped)} by hand: {e}")
+            try:
+                restore_session(cur)
+            except mysql.connector.Error:
+                pass
+            cur.close()
+        if cnx is not None:
+            cnx.close()
 
 if __name__ == "__main__":
     main()
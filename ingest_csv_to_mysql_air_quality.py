@@ -1,20 +1,32 @@
 # ===== AIR QUALITY INGESTION SCRIPT (FINAL VERSION) ===== #
 # ==== information about air quality is imported into sql server ==== #
 
-import os
-import math
+import itertools
+import re
 import pandas as pd
+from pandas.api.types import is_string_dtype
+from pandas.tseries.api import guess_datetime_format
 import numpy as np
 import mysql.connector
 from mysql.connector import errorcode
 from pathlib import Path
 from config import DB_CONFIG  # expects host, port, user, password, database
+from ingest_helpers import (bulk_insert, drop_indexes, load_data_local, max_allowed_packet,
+                            prepare_session, read_csv_chunks, rebuild_indexes, restore_session,
+                            log, PROGRESS_EVERY)
+# Optional: pyahocorasick finds every borough keyword in one pass per name;
+# without it the keyword regexes below are used
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
 
 # ========== USER SETTINGS ==========
 CSV_PATH = Path(__file__).resolve().parent.parent / "data" / "Air_Quality_20251018 copy.csv"
 TABLE = "nyc_open_source_database_air_quality"
 BATCH_SIZE = 1000
-FILE_NAME_FOR_PROVENANCE = CSV_PATH.name
+LOAD_DATA_LOCAL = False  # True -> LOAD DATA LOCAL INFILE per chunk (server needs local_infile=ON)
+DROP_INDEXES_DURING_LOAD = ()  # e.g. ("idx_geo",): dropped before the load, rebuilt after as they were
 # ===================================
 
 # Target columns (must match table)
@@ -68,114 +80,151 @@ BOROUGH_MAP_SECONDARY = {
     "northern si": "Staten Island",
 }
 
-# ---- Borough inference ----
-def infer_borough(name: str) -> str:
-    if not isinstance(name, str) or not name.strip():
-        return "Unknown"
-    n = name.lower().strip()
-
-    # Step 1: Check extended dictionary first
-    for key, borough in BOROUGH_MAP_SECONDARY.items():
-        if key in n:
-            return borough
-
-    # Step 2: Fallback to general keyword inference
-    if any(k in n for k in [
+# ---- General keyword fallback (checked in this order after the secondary map) ----
+BOROUGH_KEYWORDS = {
+    "Bronx": [
         "bronx", "fordham", "tremont", "crotona", "morris", "mott haven",
         "pelham", "riverdale", "soundview", "williamsbridge", "concourse",
         "parkchester", "highbridge"
-    ]):
-        return "Bronx"
-
-    if any(k in n for k in [
+    ],
+    "Brooklyn": [
         "brooklyn", "flatbush", "bushwick", "bedford", "crown heights",
         "borough park", "bensonhurst", "bay ridge", "brownsville", "canarsie",
         "sheepshead", "coney", "flatlands", "midwood", "prospect", "sunset park"
-    ]):
-        return "Brooklyn"
-
-    if any(k in n for k in [
+    ],
+    "Queens": [
         "queens", "jamaica", "astoria", "flushing", "elmhurst",
         "forest hills", "corona", "far rockaway", "ridgewood", "kew gardens",
         "bayside", "woodside", "rego park", "little neck", "howard beach",
         "ozone park"
-    ]):
-        return "Queens"
-
-    if any(k in n for k in [
+    ],
+    "Manhattan": [
         "manhattan", "harlem", "upper west side", "upper east side", "chelsea",
         "soho", "village", "midtown", "gramercy", "financial district",
         "tribeca", "morningside", "battery park", "inwood", "lower east side"
-    ]):
-        return "Manhattan"
-
-    if any(k in n for k in [
+    ],
+    "Staten Island": [
         "staten", "tottenville", "st. george", "staten island", "stapleton",
         "willowbrook", "great kills", "new dorp", "richmond", "south beach"
-    ]):
-        return "Staten Island"
+    ],
+}
 
-    return "Unknown"
+def keyword_pattern(keywords):
+    """One regex alternation matching any of the keywords as a substring"""
+    return "|".join(re.escape(k) for k in keywords)
+
+# Ordered (pattern, borough) rules; the first rule that matches wins.
+# Consecutive secondary-map keys for the same borough share one pattern,
+# which keeps the dict's first-key-wins order intact.
+BOROUGH_RULES = [
+    (keyword_pattern(k for k, _ in group), borough)
+    for borough, group in itertools.groupby(BOROUGH_MAP_SECONDARY.items(), key=lambda kv: kv[1])
+] + [(keyword_pattern(keywords), borough) for borough, keywords in BOROUGH_KEYWORDS.items()]
+
+# Same rules as one Aho-Corasick automaton: each keyword -> (rule priority, borough),
+# so the lowest priority among the matches is the rule the regexes would pick
+def build_borough_automaton():
+    keywords = list(BOROUGH_MAP_SECONDARY.items()) + [
+        (k, borough) for borough, keywords in BOROUGH_KEYWORDS.items() for k in keywords
+    ]
+    automaton = ahocorasick.Automaton()
+    for priority, (keyword, borough) in enumerate(keywords):
+        if keyword not in automaton:  # a repeated keyword keeps its first (winning) rule
+            automaton.add_word(keyword, (priority, borough))
+    automaton.make_automaton()
+    return automaton
+
+BOROUGH_AUTOMATON = build_borough_automaton() if ahocorasick is not None else None
+
+def borough_from_automaton(name):
+    if not isinstance(name, str):
+        return "Unknown"
+    best = min((match for _, match in BOROUGH_AUTOMATON.iter(name)), default=None)
+    return best[1] if best else "Unknown"
+
+# ---- Borough inference ----
+def infer_borough(place_lower: pd.Series) -> pd.Series:
+    """Borough for each lowercased, stripped place name ("Unknown" if nothing matches)"""
+    if BOROUGH_AUTOMATON is not None:
+        return place_lower.map(borough_from_automaton).astype(object)
+    conditions = [place_lower.str.contains(pattern, regex=True, na=False) for pattern, _ in BOROUGH_RULES]
+    choices = [borough for _, borough in BOROUGH_RULES]
+    return pd.Series(np.select(conditions, choices, default="Unknown"), index=place_lower.index)
 
 
 # ---- Geo-level inference ----
-def infer_geo_level(name: str) -> str:
-    if not isinstance(name, str) or not name.strip():
-        return "Unknown"
-    clean = name.lower().strip()
-    boroughs = ["bronx", "brooklyn", "queens", "manhattan", "staten island"]
-    if clean in boroughs:
-        return "Borough"
-    return "Neighborhood"
+BOROUGH_NAMES = {"bronx", "brooklyn", "queens", "manhattan", "staten island"}
+
+def infer_geo_level(place_lower: pd.Series) -> pd.Series:
+    """Borough / Neighborhood for each lowercased, stripped place name ("Unknown" if blank)"""
+    blank = place_lower.isna() | (place_lower == "")
+    level = np.where(place_lower.isin(BOROUGH_NAMES), "Borough", "Neighborhood")
+    return pd.Series(np.where(blank, "Unknown", level), index=place_lower.index)
+
 
+# ---- Spread per-distinct-name results back onto the rows ----
+def by_place(codes, per_name: pd.Series, missing):
+    """Row values from pd.factorize codes; code -1 (missing name) gets `missing`"""
+    return np.append(per_name.to_numpy(dtype=object), missing)[codes]
 
-def main():
-    if not Path(CSV_PATH).exists():
-        raise FileNotFoundError(f"CSV not found at: {CSV_PATH.resolve()}")
 
-    # 1️⃣ Read CSV
-    df = pd.read_csv(CSV_PATH, dtype=str, keep_default_na=True, na_values=["", "NA", "N/A"])
+# ---- Date format of a column, judged by its first non-empty value ----
+# (what pd.to_datetime infers when handed the whole file at once)
+def first_date_format(df, col):
+    names = dict(zip(normalize_headers(df.columns), df.columns))
+    if col not in names:
+        return None
+    values = df[names[col]].dropna().str.strip()
+    values = values[values != ""]
+    return guess_datetime_format(values.iloc[0]) if len(values) else None
+
+
+# ---- Clean one CSV chunk; columns come back in insert order ----
+def transform(df, file_name, date_format=None):
     df.columns = normalize_headers(df.columns)
 
-    # 2️⃣ Trim whitespace
-    df = df.applymap(lambda x: x.strip() if isinstance(x, str) else x)
+    # 1️⃣ Trim whitespace
+    df = df.apply(lambda s: s.str.strip() if is_string_dtype(s.dtype) else s)  # vectorized per column
 
-    # 3️⃣ Parse dates
+    # 2️⃣ Parse dates
     if "start_date" in df.columns:
-        df["start_date"] = pd.to_datetime(df["start_date"], errors="coerce").dt.date
+        df["start_date"] = pd.to_datetime(df["start_date"], format=date_format, errors="coerce").dt.date
     else:
         df["start_date"] = None
 
-    # 4️⃣ Numeric conversions
+    # 3️⃣ Numeric conversions
     df["unique_id"] = pd.to_numeric(df.get("unique_id"), errors="coerce").astype("Int64")
     df["indicator_id"] = pd.to_numeric(df.get("indicator_id"), errors="coerce").astype("Int64")
     df["geo_type_id"] = pd.to_numeric(df.get("geo_join_id"), errors="coerce").astype("Int64")
-    df["data_value"] = pd.to_numeric(df.get("data_value"), errors="coerce")
-
-    # 5️⃣ Add provenance, borough, and geo level
-    df["borough_norm_air"] = df["geo_place_name"].map(infer_borough)
-    df["geo_level"] = df["geo_place_name"].map(infer_geo_level)
-    df["file_name"] = FILE_NAME_FOR_PROVENANCE
-
-    # 6️⃣ Reorder columns
+    df["data_value"] = pd.to_numeric(df.get("data_value"), errors="coerce").astype("float64")
+
+    # 4️⃣ Add provenance, borough, and geo level
+    # (both inferred once per distinct place name, far fewer than rows)
+    place_lower = df["geo_place_name"].str.lower().str.strip()
+    codes, names = pd.factorize(place_lower)
+    names = pd.Series(names)
+    df["borough_norm_air"] = by_place(codes, infer_borough(names), "Unknown")
+    df["geo_level"] = by_place(codes, infer_geo_level(names), "Unknown")
+    df["file_name"] = file_name
+
+    # 5️⃣ Reorder columns
     df = df[INSERT_COLUMNS]
 
-    # 7️⃣ Clean NaNs
-    df = df.replace(
-        {pd.NA: None, np.nan: None, "nan": None, "NaN": None, "": None, "None": None}
-    )
+    # 6️⃣ Clean NaNs: text placeholders in the string columns only
+    # (real NaN / NA already turn into NULL when the rows are built)
+    str_cols = [c for c in df.columns if is_string_dtype(df[c].dtype)]
+    df[str_cols] = df[str_cols].replace({"nan": None, "NaN": None, "": None, "None": None})
+    return df
 
-    # 8️⃣ Convert to records
-    records = df.astype(object).where(pd.notnull(df), None).values.tolist()
-    total = len(records)
-    print(f"Prepared {total:,} rows from {CSV_PATH.name}")
 
-    # 9️⃣ Insert query
-    placeholders = ", ".join(["%s"] * len(INSERT_COLUMNS))
-    col_list = ", ".join(INSERT_COLUMNS)
-    insert_sql = f"INSERT INTO {TABLE} ({col_list}) VALUES ({placeholders})"
+def main(csv_path=CSV_PATH):
+    csv_path = Path(csv_path)
+    if not csv_path.exists():
+        raise FileNotFoundError(f"CSV not found at: {csv_path.resolve()}")
 
-    # 🔟 Connect and insert
+    # 7️⃣ Connect, then read → clean → insert one BATCH_SIZE chunk at a time
+    cnx = cur = ins = None
+    dropped = {}
     try:
         cnx = mysql.connector.connect(
             host=DB_CONFIG["host"],
@@ -183,27 +232,49 @@ def main():
             user=DB_CONFIG["user"],
             password=DB_CONFIG["password"],
             database=DB_CONFIG["database"],
-            autocommit=False
+            autocommit=False,
+            allow_local_infile=LOAD_DATA_LOCAL,
+            use_pure=False  # C extension (libmysqlclient), not the pure-Python protocol
         )
         cur = cnx.cursor()
+        ins = cnx.cursor(prepared=True)  # server-side prepared INSERT (see bulk_insert)
+        # 8️⃣ Bulk-load session: no per-row unique / foreign key checks, secondary
+        # indexes off until the end, and multi-row INSERTs sized to the packet limit
+        prepare_session(cur)
+        packet = max_allowed_packet(cur)
+        dropped = drop_indexes(cur, TABLE, DROP_INDEXES_DURING_LOAD)
+
+        # 9️⃣ Read CSV lazily (only one chunk is in memory at a time)
+        reader = read_csv_chunks(csv_path, BATCH_SIZE)
+        total = 0
+        date_format = None
+        for b, chunk in enumerate(reader):
+            # The date format is fixed from the first chunk so every chunk parses alike
+            if b == 0:
+                date_format = first_date_format(chunk, "start_date")
+            df = transform(chunk, csv_path.name, date_format)
+            start, end = total, total + len(df)
+            if b % PROGRESS_EVERY == 0:
+                log.info("Inserting rows %d..%d (%d rows)", start, end - 1, len(df))
+            try:
+                if LOAD_DATA_LOCAL:
+                    load_data_local(cur, TABLE, INSERT_COLUMNS, df)
+                else:
+                    rows = df.to_numpy(dtype=object, na_value=None).tolist()
+                    bulk_insert(ins, TABLE, INSERT_COLUMNS, rows, BATCH_SIZE, packet)
+            except Exception as e:
+                cnx.rollback()
+                print(f"Batch {b+1} failed ({start}-{end-1}): {e}")
+                raise
+            total = end
+
+        # One commit for the whole file (a failed batch rolls everything back)
+        cnx.commit()
 
         if total == 0:
             print("Nothing to insert.")
         else:
-            batches = math.ceil(total / BATCH_SIZE)
-            start = 0
-            for b in range(batches):
-                end = min(start + BATCH_SIZE, total)
-                batch = records[start:end]
-                print(f"Inserting rows {start}..{end-1} ({len(batch)} rows)")
-                try:
-                    cur.executemany(insert_sql, batch)
-                    cnx.commit()
-                except Exception as e:
-                    cnx.rollback()
-                    print(f"Batch {b+1}/{batches} failed ({start}-{end-1}): {e}")
-                    raise
-                start = end
+            print(f"Inserted {total:,} rows from {csv_path.name}")
 
         # ✅ Verification
         cur.execute(f"SELECT COUNT(*), COUNT(CASE WHEN borough_norm_air='Unknown' THEN 1 END) FROM {TABLE}")
@@ -219,10 +290,21 @@ def main():
             print(f"MySQL error: {err}")
         raise
     finally:
-        try: cur.close()
-        except: pass
-        try: cnx.close()
-        except: pass
+        # Only rebuild, restore and close what was actually opened
+        if ins is not None:
+            ins.close()
+        if cur is not None:
+            try:
+                rebuild_indexes(cur, TABLE, dropped)
+            except mysql.connector.Error as e:
+                print(f"Index rebuild on {TABLE} failed, re-create {list(dropped)} by hand: {e}")
+            try:
+                restore_session(cur)
+            except mysql.connector.Error:
+                pass
+            cur.close()
+        if cnx is not None:
+            cnx.close()
 
 
 if __name__ == "__main__":
@@ -1,17 +1,20 @@
 # ===== PYTHON QUERY TO IMPORT BERKELEY EARTH TEMPERATURE DATA INTO MYSQL ===== #
 
 import math
-import pandas as pd
 import numpy as np
 import mysql.connector
-from mysql.connector import errorcode
 from pathlib import Path
 from config import DB_CONFIG  # expects: host, port, user, password, database
+from ingest_helpers import (bulk_insert, drop_indexes, load_data_local, max_allowed_packet,
+                            prepare_session, read_csv_frame, rebuild_indexes, restore_session,
+                            log, PROGRESS_EVERY)
 
 # ==== USER SETTINGS ====
 CSV_PATH = Path(__file__).resolve().parent.parent / "data" / "berkeley-earth-temperature-data.csv"
 TABLE = "berkeley_earth_north_america"
 BATCH_SIZE = 10000
+LOAD_DATA_LOCAL = False  # True -> one LOAD DATA LOCAL INFILE for the file (server needs local_infile=ON)
+DROP_INDEXES_DURING_LOAD = ()  # e.g. ("idx_year_month",): dropped before the load, rebuilt after as they were
 FILE_NAME_FOR_PROVENANCE = CSV_PATH.name
 # ========================
 
@@ -23,6 +26,16 @@ MONTH_BASELINES = {
     9: 10.23, 10: 3.67, 11: -3.75, 12: -9.64
 }
 
+# Source columns in file order (12 columns after the header line)
+SRC_COLUMNS = [
+    "year", "month",
+    "monthly_anomaly", "monthly_uncertainty",
+    "annual_anomaly", "annual_uncertainty",
+    "fiveyear_anomaly", "fiveyear_uncertainty",
+    "tenyear_anomaly", "tenyear_uncertainty",
+    "twentyyear_anomaly", "twentyyear_uncertainty"
+]
+
 INSERT_COLUMNS = [
     "year", "month",
     "monthly_anomaly", "monthly_uncertainty",
@@ -39,124 +52,97 @@ INSERT_COLUMNS = [
     "file_name"
 ]
 
-def to_float(x):
-    try:
-        return float(x)
-    except (TypeError, ValueError):
-        return None
-
-def c_to_f(x):
-    return x * 9 / 5 + 32 if pd.notna(x) else None
-
 def main():
     if not CSV_PATH.exists():
         raise FileNotFoundError(f"CSV not found at: {CSV_PATH.resolve()}")
 
-    # === 1. Detect where the real data header starts ===
+    # === 1. Detect where the real data header starts (only reads up to it) ===
+    start_line = 0
     with open(CSV_PATH, "r") as f:
-        lines = f.readlines()
+        for i, line in enumerate(f):
+            if line.strip().startswith("Year"):
+                start_line = i
+                break
 
-    start_line = 0
-    for i, line in enumerate(lines):
-        if line.strip().startswith("Year"):
-            start_line = i
-            break
-
-    # === 2. Load CSV ===
-    df = pd.read_csv(CSV_PATH, engine="python", dtype=str, skiprows=start_line)
-    print("Raw columns:", list(df.columns))
-
-    # === 3. Rename columns by position ===
-    rename_by_pos = {
-        df.columns[0]: "year",
-        df.columns[1]: "month",
-        df.columns[2]: "monthly_anomaly",
-        df.columns[3]: "monthly_uncertainty",
-        df.columns[4]: "annual_anomaly",
-        df.columns[5]: "annual_uncertainty",
-        df.columns[6]: "fiveyear_anomaly",
-        df.columns[7]: "fiveyear_uncertainty",
-        df.columns[8]: "tenyear_anomaly",
-        df.columns[9]: "tenyear_uncertainty",
-        df.columns[10]: "twentyyear_anomaly",
-        df.columns[11]: "twentyyear_uncertainty"
-    }
-    df = df.rename(columns=rename_by_pos)
-    df = df[list(rename_by_pos.values())]
-
-    # === 4. Convert numeric columns ===
-    for c in df.columns:
-        df[c] = df[c].map(to_float)
-
-    # === 5. Drop any non-numeric metadata rows ===
+    # === 2. Load CSV as floats, columns named by position (the header repeats "Unc.") ===
+    # (pyarrow's multi-threaded reader parses the numbers when installed;
+    # unparseable cells -> NaN)
+    df = read_csv_frame(CSV_PATH, skip_rows=start_line, names=SRC_COLUMNS, numeric=True)
+
+    # === 3. Drop any non-numeric metadata rows ===
     before = len(df)
     df = df.dropna(subset=["year", "month"])
     after = len(df)
     print(f"Dropped {before - after} non-data rows (missing year/month).")
 
-    # === 6. Compute absolute monthly/smoothed temperatures (°C) ===
-    def abs_month_temp(row):
-        m = int(row["month"]) if pd.notna(row["month"]) else None
-        base = MONTH_BASELINES.get(m)
-        if pd.notna(row["monthly_anomaly"]) and base is not None:
-            return base + row["monthly_anomaly"]
-        return np.nan
-
-    df["abs_monthly_temp"] = df.apply(abs_month_temp, axis=1)
+    # === 4. Compute absolute monthly/smoothed temperatures (°C) ===
+    # Month -> baseline lookup over the whole column (truncated like int());
+    # an unknown month or missing anomaly leaves NaN
+    month_base = np.trunc(df["month"]).map(MONTH_BASELINES).astype("float64")
+    df["abs_monthly_temp"] = month_base + df["monthly_anomaly"]
     df["abs_annual_temp"] = BASELINE_GLOBAL + df["annual_anomaly"]
     df["abs_5y_temp"] = BASELINE_GLOBAL + df["fiveyear_anomaly"]
     df["abs_10y_temp"] = BASELINE_GLOBAL + df["tenyear_anomaly"]
     df["abs_20y_temp"] = BASELINE_GLOBAL + df["twentyyear_anomaly"]
 
-    # === 7. Calendar-year mean of monthly absolute temps ===
-    yearly_mean = (
-        df.groupby("year", as_index=False)["abs_monthly_temp"]
-          .mean()
-          .rename(columns={"abs_monthly_temp": "yearly_mean_temp"})
-    )
-    df = df.merge(yearly_mean, on="year", how="left")
-
-    # === 8. Convert °C → °F ===
-    df["abs_monthly_temp_f"] = df["abs_monthly_temp"].map(c_to_f)
-    df["abs_annual_temp_f"] = df["abs_annual_temp"].map(c_to_f)
-    df["abs_5y_temp_f"] = df["abs_5y_temp"].map(c_to_f)
-    df["abs_10y_temp_f"] = df["abs_10y_temp"].map(c_to_f)
-    df["abs_20y_temp_f"] = df["abs_20y_temp"].map(c_to_f)
-    df["yearly_mean_temp_f"] = df["yearly_mean_temp"].map(c_to_f)
-
-    # === 9. Add provenance and clean NaNs ===
+    # === 5. Calendar-year mean of monthly absolute temps (broadcast back per row) ===
+    df["yearly_mean_temp"] = df.groupby("year")["abs_monthly_temp"].transform("mean")
+
+    # === 6. Convert °C → °F (all six columns as one 2-D array, updated in place) ===
+    c_cols = ["abs_monthly_temp", "abs_annual_temp", "abs_5y_temp",
+              "abs_10y_temp", "abs_20y_temp", "yearly_mean_temp"]
+    temps_f = df[c_cols].to_numpy(dtype="float64") * 9
+    temps_f /= 5
+    temps_f += 32
+    df[[c + "_f" for c in c_cols]] = temps_f
+
+    # === 7. Add provenance and clean NaNs ===
     df["file_name"] = FILE_NAME_FOR_PROVENANCE
-    df = df.replace({np.nan: None})
     df = df[INSERT_COLUMNS]
 
-    records = df.astype(object).values.tolist()
-    total = len(records)
+    total = len(df)
     print(f"Prepared {total:,} clean rows for insertion.")
 
-    # === 10. Insert into MySQL ===
-    placeholders = ", ".join(["%s"] * len(INSERT_COLUMNS))
-    col_list = ", ".join(f"`{c}`" for c in INSERT_COLUMNS)
-    insert_sql = f"INSERT INTO {TABLE} ({col_list}) VALUES ({placeholders})"
-
+    # === 8. Insert into MySQL (multi-row INSERTs sized to max_allowed_packet) ===
+    cnx = cur = ins = None
+    dropped = {}
     try:
-        cnx = mysql.connector.connect(**DB_CONFIG)
+        cnx = mysql.connector.connect(**DB_CONFIG, allow_local_infile=LOAD_DATA_LOCAL,
+                                      use_pure=False)  # C extension, not pure Python
         cur = cnx.cursor()
+        ins = cnx.cursor(prepared=True)  # server-side prepared INSERT (see bulk_insert)
+        # Bulk-load session: skip per-row unique / foreign key checks,
+        # secondary indexes come off for the load and are rebuilt once in finally
+        prepare_session(cur)
+        packet = max_allowed_packet(cur)
+        dropped = drop_indexes(cur, TABLE, DROP_INDEXES_DURING_LOAD)
 
         if total == 0:
             print("Nothing to insert.")
+        elif LOAD_DATA_LOCAL:
+            try:
+                load_data_local(cur, TABLE, INSERT_COLUMNS, df)
+                cnx.commit()
+            except Exception as e:
+                cnx.rollback()
+                print(f"LOAD DATA failed: {e}")
+                raise
         else:
             batches = math.ceil(total / BATCH_SIZE)
             for b in range(batches):
                 start, end = b * BATCH_SIZE, min((b + 1) * BATCH_SIZE, total)
-                batch = records[start:end]
-                print(f"Inserting rows {start}..{end - 1} ({len(batch)} rows)")
+                # Only this batch becomes Python objects (NaN -> None)
+                batch = df.iloc[start:end].to_numpy(dtype=object, na_value=None).tolist()
+                if b % PROGRESS_EVERY == 0:
+                    log.info("Inserting rows %d..%d (%d rows)", start, end - 1, len(batch))
                 try:
-                    cur.executemany(insert_sql, batch)
-                    cnx.commit()
+                    bulk_insert(ins, TABLE, INSERT_COLUMNS, batch, BATCH_SIZE, packet)
                 except Exception as e:
                     cnx.rollback()
                     print(f"Batch {b + 1}/{batches} failed ({start}-{end - 1}): {e}")
                     raise
+            # One commit for the whole file (a failed batch rolls everything back)
+            cnx.commit()
 
         cur.execute(f"SELECT COUNT(*) FROM {TABLE}")
         (count,) = cur.fetchone()
@@ -170,10 +156,21 @@ def main():
         print(f"MySQL error: {err}")
         raise
     finally:
-        try: cur.close()
-        except: pass
-        try: cnx.close()
-        except: pass
+        # Only rebuild, restore and close what was actually opened
+        if ins is not None:
+            ins.close()
+        if cur is not None:
+            try:
+                rebuild_indexes(cur, TABLE, dropped)
+            except mysql.connector.Error as e:
+                print(f"Index rebuild on {TABLE} failed, re-create {list(dropped)} by hand: {e}")
+            try:
+                restore_session(cur)
+            except mysql.connector.Error:
+                pass
+            cur.close()
+        if cnx is not None:
+            cnx.close()
 
 if __name__ == "__main__":
     main()
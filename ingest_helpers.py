@@ -0,0 +1,303 @@
+# ===== SHARED HELPERS FOR THE CSV -> MYSQL INGEST SCRIPTS ===== #
+
+import csv
+import functools
+import itertools
+import logging
+import os
+import tempfile
+
+import pandas as pd
+
+# Use pyarrow's multi-threaded CSV reader when it is installed,
+# fall back to pandas' C engine otherwise
+try:
+    import pyarrow as pa
+    from pyarrow import csv as pacsv
+    ENGINE = "pyarrow"
+except ImportError:
+    ENGINE = "c"
+
+# Extra NA markers on top of the defaults (same as the scripts' read_csv calls)
+NA_VALUES = ["", "NA", "N/A"]
+
+# pandas' default NA strings that pyarrow does not treat as null on its own
+_PANDAS_ONLY_NA = ["<NA>", "None"]
+
+# MySQL's limit on placeholders in a single prepared statement
+MAX_PLACEHOLDERS = 65535
+
+# Per-batch progress goes through this logger, every PROGRESS_EVERY batches.
+# Silent by default; logging.basicConfig(level=logging.INFO) turns it on.
+log = logging.getLogger("ingest")
+log.addHandler(logging.NullHandler())
+PROGRESS_EVERY = 50
+
+
+def read_csv_chunks(csv_path, chunksize):
+    """Yield the CSV as all-string DataFrames of at most `chunksize` rows.
+
+    Same values as pd.read_csv(dtype=str, keep_default_na=True,
+    na_values=NA_VALUES, chunksize=chunksize). pandas' pyarrow engine
+    can't chunk, so on that path the file is streamed with pyarrow's
+    incremental reader: record batches are collected until there are
+    `chunksize` rows, then handed out, so only about one chunk is held
+    at a time. Those chunks keep Arrow-backed string columns
+    (string[pyarrow]) rather than object columns; callers convert with
+    to_numpy(dtype=object) only when handing rows to the driver. Without
+    pyarrow the columns are plain object.
+    """
+    if ENGINE != "pyarrow":
+        yield from pd.read_csv(csv_path, dtype=str, keep_default_na=True,
+                               na_values=NA_VALUES, chunksize=chunksize)
+        return
+
+    reader = pacsv.open_csv(csv_path, **_arrow_csv_options(csv_path))
+    pending, rows = [], 0
+    for batch in reader:
+        pending.append(batch)
+        rows += batch.num_rows
+        while rows >= chunksize:
+            table = pa.Table.from_batches(pending, schema=reader.schema)
+            yield table.slice(0, chunksize).to_pandas(types_mapper=pd.ArrowDtype)
+            rest = table.slice(chunksize)
+            pending, rows = rest.to_batches(), rest.num_rows
+    if rows:
+        yield pa.Table.from_batches(pending, schema=reader.schema).to_pandas(types_mapper=pd.ArrowDtype)
+
+
+def read_csv_frame(csv_path, skip_rows=0, names=None, numeric=False):
+    """Read a whole CSV as one DataFrame, same values as read_csv_chunks().
+
+    The first `skip_rows` lines (a preamble ahead of the header) are
+    skipped, as with pd.read_csv(skiprows=skip_rows). `names` renames the
+    columns by position and drops any past the last name, so a header that
+    repeats a name (several "Unc." columns, say) is fine. With
+    numeric=True every column is float64, anything that is not a number
+    NaN, as pd.to_numeric(errors="coerce") would give.
+
+    With pyarrow the file is parsed multi-threaded: string columns stay
+    string[pyarrow], and a numeric read parses the floats directly rather
+    than building strings to re-parse. A file pyarrow rejects (rows shorter
+    than the header, text in a numeric column) is read by pandas' C engine
+    instead, which pads short rows with NaN.
+    """
+    if ENGINE == "pyarrow":
+        column_type = pa.float64() if numeric else pa.string()
+        try:
+            table = pacsv.read_csv(csv_path, **_arrow_csv_options(csv_path, skip_rows, names, column_type))
+            return table.to_pandas(types_mapper=None if numeric else pd.ArrowDtype)
+        except pa.ArrowInvalid:
+            pass
+
+    df = pd.read_csv(csv_path, dtype=str, keep_default_na=True,
+                     na_values=NA_VALUES, skiprows=skip_rows)
+    if names is not None:
+        df = df.iloc[:, :len(names)]
+        df.columns = list(names)
+    if numeric:
+        df = df.apply(pd.to_numeric, errors="coerce").astype("float64")
+    return df
+
+
+def _arrow_csv_options(csv_path, skip_rows=0, names=None, column_type=None):
+    # Every column as a nullable `column_type` (string by default), with
+    # pandas' NA markers as nulls
+    with open(csv_path, newline="", encoding="utf-8-sig") as f:
+        header = next(itertools.islice(csv.reader(f), skip_rows, None), [])
+
+    read_options = pacsv.ReadOptions(skip_rows=skip_rows)
+    include_columns = None
+    if names is not None:
+        # Skip the header line too and name the columns by position;
+        # columns past the last name get placeholders and are not converted
+        header = list(names) + [f"_unnamed_{i}" for i in range(len(names), len(header))]
+        read_options = pacsv.ReadOptions(skip_rows=skip_rows + 1, column_names=header)
+        include_columns = list(names)
+
+    return {
+        "read_options": read_options,
+        "parse_options": pacsv.ParseOptions(newlines_in_values=True),
+        "convert_options": pacsv.ConvertOptions(
+            column_types={c: column_type or pa.string() for c in header},
+            null_values=pacsv.ConvertOptions().null_values + NA_VALUES + _PANDAS_ONLY_NA,
+            strings_can_be_null=True,
+            include_columns=include_columns,
+        ),
+    }
+
+
+def prepare_session(cur, unique_checks=False):
+    """Skip per-row unique / foreign key checks for the rest of this session.
+
+    Meant to be called once right after connecting for a bulk load; undo
+    with restore_session() before the connection is handed back. Pass
+    unique_checks=True for upserts: ON DUPLICATE KEY UPDATE needs InnoDB to
+    see the duplicate in a secondary unique index.
+    """
+    if not unique_checks:
+        cur.execute("SET SESSION unique_checks = 0")
+    cur.execute("SET SESSION foreign_key_checks = 0")
+
+
+def restore_session(cur):
+    """Turn the checks disabled by prepare_session() back on."""
+    cur.execute("SET SESSION unique_checks = 1")
+    cur.execute("SET SESSION foreign_key_checks = 1")
+
+
+def drop_indexes(cur, table, names):
+    """Drop secondary indexes ahead of a bulk load, in one ALTER TABLE.
+
+    `names` lists the index names, e.g. ("idx_zip",). Their definitions are
+    read from information_schema first and returned as {name: "ADD ..."}
+    clauses for rebuild_indexes(), so kind (FULLTEXT, SPATIAL), column
+    order, prefix lengths and DESC come back as they were. Refused, before
+    anything is dropped: unknown names, UNIQUE / PRIMARY indexes (the load
+    runs with unique_checks = 0, so nothing would catch a duplicate) and
+    functional indexes. One statement means all of them go or none do; like
+    any DDL it also commits whatever the connection had open.
+    """
+    if not names:
+        return {}
+    cur.execute(
+        "SELECT INDEX_NAME, NON_UNIQUE, INDEX_TYPE, COLUMN_NAME, SUB_PART, COLLATION "
+        "FROM information_schema.STATISTICS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s "
+        "ORDER BY INDEX_NAME, SEQ_IN_INDEX",
+        (table,),
+    )
+    found = {}
+    for name, non_unique, index_type, column, sub_part, collation in cur.fetchall():
+        if name not in names:
+            continue
+        if int(non_unique) == 0:
+            raise ValueError(f"{table}.{name} is UNIQUE; the load skips unique checks, so it stays")
+        if column is None:
+            raise ValueError(f"{table}.{name} is a functional index; re-create it by hand instead")
+        part = f"`{column}`" + (f"({sub_part})" if sub_part else "") + (" DESC" if collation == "D" else "")
+        found.setdefault(name, (index_type, []))[1].append(part)
+    missing = [n for n in names if n not in found]
+    if missing:
+        raise ValueError(f"No such index on {table}: {missing}")
+
+    dropped = {}
+    for name in names:
+        index_type, parts = found[name]
+        kind = {"FULLTEXT": "FULLTEXT INDEX", "SPATIAL": "SPATIAL INDEX"}.get(index_type, "INDEX")
+        using = " USING HASH" if index_type == "HASH" else ""
+        dropped[name] = f"ADD {kind} `{name}` ({', '.join(parts)}){using}"
+    drops = ", ".join(f"DROP INDEX `{name}`" for name in dropped)
+    cur.execute(f"ALTER TABLE {table} {drops}")
+    return dropped
+
+
+def rebuild_indexes(cur, table, indexes):
+    """Re-create the indexes removed by drop_indexes() from the clauses it returned.
+
+    Everything is added in one ALTER TABLE, so InnoDB builds each index
+    with a single sort over the loaded rows instead of row by row.
+    """
+    if indexes:
+        cur.execute(f"ALTER TABLE {table} {', '.join(indexes.values())}")
+
+
+def load_data_local(cur, table, columns, df):
+    """Bulk load a cleaned DataFrame with LOAD DATA LOCAL INFILE.
+
+    `df` must already be in `columns` order. It is written to a temporary
+    CSV (NULLs as the bare word NULL, strings quoted only when needed) and
+    streamed to the server in a single statement. The connection has to be
+    opened with allow_local_infile=True and a plain (non-prepared) cursor.
+    """
+    with tempfile.NamedTemporaryFile("w", suffix=".csv", newline="", encoding="utf-8",
+                                     delete=False) as tmp:
+        df.to_csv(tmp, index=False, header=False, na_rep="NULL", lineterminator="\n")
+    try:
+        col_list = ", ".join(f"`{c}`" for c in columns)
+        cur.execute(
+            f"LOAD DATA LOCAL INFILE %s INTO TABLE {table} CHARACTER SET utf8mb4 "
+            "FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' ESCAPED BY '' "
+            f"LINES TERMINATED BY '\\n' ({col_list})",
+            (tmp.name,),
+        )
+    finally:
+        os.remove(tmp.name)
+
+
+def load_data_upsert(cur, table, columns, df, update_list):
+    """LOAD DATA LOCAL a cleaned chunk, then merge it into `table` as an upsert.
+
+    LOAD DATA has no ON DUPLICATE KEY UPDATE, so the rows are loaded into a
+    session-private staging table (same columns as `table`, no indexes, so
+    a repeated key inside the chunk isn't dropped) and merged with a single
+    INSERT ... SELECT ... ON DUPLICATE KEY UPDATE `update_list`.
+    """
+    staging = f"{table}_staging"
+    col_list = ", ".join(f"`{c}`" for c in columns)
+    cur.execute(f"CREATE TEMPORARY TABLE IF NOT EXISTS {staging} AS SELECT {col_list} FROM {table} LIMIT 0")
+    cur.execute(f"TRUNCATE TABLE {staging}")
+    load_data_local(cur, staging, columns, df)
+    cur.execute(f"INSERT INTO {table} ({col_list}) SELECT {col_list} FROM {staging} "
+                f"ON DUPLICATE KEY UPDATE {update_list}")
+
+
+@functools.lru_cache(maxsize=8)
+def _insert_sql(table, columns, nrows, suffix=""):
+    # Cached: a repeated batch shape gets the very same string object back,
+    # which is what lets a prepared cursor skip re-preparing it. A full-size
+    # statement is ~270 kB of placeholders, so only a few shapes are kept
+    col_list = ", ".join(f"`{c}`" for c in columns)
+    row = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    return f"INSERT INTO {table} ({col_list}) VALUES " + ", ".join([row] * nrows) + suffix
+
+
+def _row_bytes(row):
+    # Rough wire size of one bound row: value text + a few bytes of header each
+    return sum(9 + (0 if v is None else len(str(v))) for v in row)
+
+
+def max_allowed_packet(cur):
+    """Return the server's max_allowed_packet (bytes) for sizing bulk_insert batches."""
+    cur.execute("SELECT @@max_allowed_packet")
+    (size,) = cur.fetchone()
+    return int(size)
+
+
+def bulk_insert(cur, table, columns, rows, batch=50000, max_packet=None, suffix=""):
+    """Insert `rows` (tuples in `columns` order) as multi-row INSERT statements.
+
+    Rows go out `batch` at a time as one INSERT ... VALUES (...), (...),
+    with `suffix` (e.g. " ON DUPLICATE KEY UPDATE ...") appended. A batch
+    is made smaller when it would pass MAX_PLACEHOLDERS or, given
+    `max_packet` (see max_allowed_packet()), when the widest of the first
+    rows says it wouldn't fit in half a packet.
+    `cur` is ideally a prepared cursor, cnx.cursor(prepared=True), opened
+    once per connection (a prepared cursor's executemany() would run one
+    statement per row instead). It re-prepares whenever the statement
+    differs from the one it ran last, so back-to-back full batches share a
+    plan, while a short last batch costs one more prepare, and so does the
+    next call's first full batch: two per call when `rows` is not a
+    multiple of the batch size, one when it is. A plain cursor works too;
+    the driver then escapes the values into the statement text client-side.
+    Returns the number of rows sent.
+    """
+    columns = tuple(columns)
+    per_stmt = max(1, min(batch, MAX_PLACEHOLDERS // len(columns)))
+    rows = iter(rows)
+    if max_packet:
+        sample = list(itertools.islice(rows, per_stmt))
+        if sample:
+            widest = max(_row_bytes(r) for r in sample)
+            per_stmt = max(1, min(per_stmt, max_packet // (2 * widest)))
+        rows = itertools.chain(sample, rows)
+
+    total = 0
+    while True:
+        chunk = list(itertools.islice(rows, per_stmt))
+        if not chunk:
+            break
+        cur.execute(_insert_sql(table, columns, len(chunk), suffix),
+                    list(itertools.chain.from_iterable(chunk)))
+        total += len(chunk)
+    return total
@@ -1,66 +1,154 @@
 # ===== PYTHON INGEST FOR NOAA MONTHLY WEATHER INTO weather_monthly ===== #
 
-import math
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
 import pandas as pd
 import numpy as np
 import mysql.connector
-from mysql.connector import errorcode
 from pathlib import Path
-from datetime import datetime
 
 from config import DB_CONFIG   # expects host, port, user, password, database
+from ingest_helpers import (bulk_insert, load_data_upsert, max_allowed_packet, prepare_session,
+                            restore_session, log, PROGRESS_EVERY)
 
 # === USER SETTINGS ===
 CSV_DIR = Path(__file__).resolve().parent.parent / "data" / "weather"
 TABLE = "weather_monthly"
 BATCH_SIZE = 5000
+LOAD_DATA_LOCAL = False  # True -> LOAD DATA LOCAL INFILE + upsert per chunk (server needs local_infile=ON)
+MAX_WORKERS = 4  # CSV files read and cleaned ahead on worker threads while one is upserted
 # =====================
 
-# Fahrenheit → Celsius
-def f_to_c(f):
-    if f is None:
-        return None
-    try:
-        return (float(f) - 32) * 5.0 / 9.0
-    except:
-        return None
-
-def to_date_month(s):
-    """Convert NOAA date like 2024-03 into YYYY-MM-01"""
-    if not isinstance(s, str):
-        return None
-    try:
-        dt = datetime.strptime(s.strip(), "%Y-%m")
-        return dt.strftime("%Y-%m-01")
-    except:
-        return None
-
-def clean_numeric(val):
-    """Convert '', NaN, or strings to None"""
-    if val is None:
-        return None
-    if isinstance(val, float) and np.isnan(val):
-        return None
-    val = str(val).strip()
-    if val == "" or val.lower() in {"nan", "na", "null"}:
-        return None
-    try:
-        return float(val)
-    except:
-        return None
+# Columns required by SQL, in insert order
+INSERT_COLUMNS = [
+    "station_id","station_name","date_month",
+    "cdsd","emnt","emxt","hdsd","tavg","tmax","tmin",
+    "tavg_c","tmax_c","tmin_c",
+    "file_name"
+]
 
-def load_csv_files():
-    """Return list of all CSV files inside data/weather directory."""
-    return sorted(CSV_DIR.glob("*.csv"))
+# Source columns transform() reads (lowercased); NOAA exports carry many more
+# (*_ATTRIBUTES flags, other elements) that are never parsed
+NUMERIC_COLUMNS = ["cdsd", "hdsd", "emnt", "emxt", "tavg", "tmax", "tmin"]
+SOURCE_COLUMNS = {"station", "name", "date", *NUMERIC_COLUMNS}
 
-def main():
+# UPSERT logic — prevents duplicates (appended to each multi-row INSERT)
+UPDATE_LIST = ", ".join(f"{c}=VALUES({c})" for c in INSERT_COLUMNS if c not in {"station_id","date_month"})
+UPSERT_SUFFIX = f" ON DUPLICATE KEY UPDATE {UPDATE_LIST}"
 
-    csv_files = load_csv_files()
+def load_csv_files(csv_dir=CSV_DIR):
+    """Return list of all CSV files inside data/weather directory."""
+    return sorted(csv_dir.glob("*.csv"))
+
+def transform(df, file_name):
+    """Clean one chunk of a NOAA monthly CSV into INSERT_COLUMNS order."""
+    # Normalize column names
+    df.columns = [c.strip().lower() for c in df.columns]
+
+    # Ensure required columns exist
+    required = ["station", "name", "date"]
+    for col in required:
+        if col not in df.columns:
+            raise ValueError(f"Column '{col}' missing in {file_name}")
+
+    # Convert types
+    df["station_id"] = df["station"]
+    df["station_name"] = df["name"]
+    # NOAA date like 2024-03 (or 2024-3) -> YYYY-MM-01; anything else -> NaN
+    date = df["date"].str.strip()
+    date = date.mask(date.isin(["now", "today"]))  # to_datetime would read these as the current date
+    month = pd.to_datetime(date, format="%Y-%m", errors="coerce")
+    df["date_month"] = month.dt.strftime("%Y-%m-01")
+
+    # Numeric fields: '', 'nan', 'NA', text -> NaN; a missing column is all NaN
+    for col in NUMERIC_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+        else:
+            df[col] = np.nan
+
+    # Degree-day counts are whole numbers (truncated, as int() did)
+    for col in ["cdsd", "hdsd"]:
+        df[col] = np.trunc(df[col]).astype("Int64")
+
+    # Fahrenheit → Celsius
+    for col in ["tavg", "tmax", "tmin"]:
+        df[f"{col}_c"] = (df[col] - 32) * 5.0 / 9.0
+
+    df["file_name"] = file_name
+
+    df = df[INSERT_COLUMNS]
+
+    # Drop rows missing date or station_id
+    df = df[df["date_month"].notnull()]
+    df = df[df["station_id"].notnull()]
+
+    # Upsert in key order so the chunk walks the unique index sequentially;
+    # the sort is stable, so a key repeated in the chunk still ends on its last row
+    return df.sort_values(["station_id", "date_month"], kind="stable")
+
+def read_file(csv_path):
+    """Read and clean one NOAA CSV into upsert-ready chunks (runs on a worker thread)."""
+    # keep_default_na=False as before: only the numeric parse decides what's missing;
+    # only the SOURCE_COLUMNS are tokenized into values at all
+    reader = pd.read_csv(csv_path, dtype=str, keep_default_na=False, chunksize=BATCH_SIZE,
+                         usecols=lambda c: c.strip().lower() in SOURCE_COLUMNS)
+    return [transform(chunk, csv_path.name) for chunk in reader]
+
+def read_files_ahead(csv_files):
+    """Yield (csv_path, chunks) in csv_files order, reading up to MAX_WORKERS files ahead.
+
+    Each file is held whole once read, so at most MAX_WORKERS + 1 files are
+    in memory at a time (NOAA monthly exports are a few thousand rows each).
+    """
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        pending = deque()
+        for csv_path in csv_files:
+            pending.append((csv_path, executor.submit(read_file, csv_path)))
+            if len(pending) > MAX_WORKERS:
+                path, future = pending.popleft()
+                yield path, future.result()
+        while pending:
+            path, future = pending.popleft()
+            yield path, future.result()
+
+def upsert_file(cnx, cur, ins, packet, csv_path, chunks):
+    """Upsert one file's cleaned chunks and commit them together; returns the row count."""
+    total = 0
+    for batch_num, df in enumerate(chunks):
+        start, end = total, total + len(df)
+        if batch_num % PROGRESS_EVERY == 0:
+            log.info("%s: inserting rows %d..%d", csv_path.name, start, end - 1)
+
+        try:
+            if LOAD_DATA_LOCAL:
+                load_data_upsert(cur, TABLE, INSERT_COLUMNS, df, UPDATE_LIST)
+            else:
+                # Convert to Python objects, sent as multi-row upserts
+                rows = df.to_numpy(dtype=object, na_value=None).tolist()
+                bulk_insert(ins, TABLE, INSERT_COLUMNS, rows, BATCH_SIZE, packet, UPSERT_SUFFIX)
+        except Exception as e:
+            cnx.rollback()
+            print(f"FAILED during {csv_path.name} batch {batch_num+1}: {e}")
+            raise
+
+        total = end
+
+    # One commit per file (a failed batch rolls back that whole file)
+    cnx.commit()
+    return total
+
+def main(csv_dir=CSV_DIR):
+
+    csv_files = load_csv_files(csv_dir)
     print(f"Found {len(csv_files)} CSV files to import.")
 
     if not csv_files:
         return
 
+    cnx = cur = ins = None
+    done = 0
     try:
         cnx = mysql.connector.connect(
             host=DB_CONFIG["host"],
@@ -68,99 +156,25 @@ def main():
             user=DB_CONFIG["user"],
             password=DB_CONFIG["password"],
             database=DB_CONFIG["database"],
-            autocommit=False
+            autocommit=False,
+            allow_local_infile=LOAD_DATA_LOCAL,
+            use_pure=False  # C extension (libmysqlclient), not the pure-Python protocol
         )
         cur = cnx.cursor()
-
-        for csv_path in csv_files:
+        ins = cnx.cursor(prepared=True)  # server-side prepared upsert (see bulk_insert)
+        # Bulk-load session without foreign key checks; unique checks stay on,
+        # the upsert relies on them to find existing (station_id, date_month) rows
+        prepare_session(cur, unique_checks=True)
+        packet = max_allowed_packet(cur)
+
+        # Files are read and cleaned in parallel, but upserted one at a time in
+        # sorted order: a (station_id, date_month) in several files ends up
+        # with the last file's row, as when each file was read in turn
+        for csv_path, chunks in read_files_ahead(csv_files):
             print(f"\n=== Loading {csv_path.name} ===")
-
-            df = pd.read_csv(csv_path, dtype=str, keep_default_na=False)
-
-            # Normalize column names
-            df.columns = [c.strip().lower() for c in df.columns]
-
-            # Ensure required columns exist
-            required = ["station", "name", "date"]
-            for col in required:
-                if col not in df.columns:
-                    raise ValueError(f"Column '{col}' missing in {csv_path.name}")
-
-            # Convert types
-            df["station_id"] = df["station"]
-            df["station_name"] = df["name"]
-            df["date_month"] = df["date"].map(to_date_month)
-
-            # Numeric fields
-            for col in ["cdsd", "hdsd"]:
-                if col in df.columns:
-                    df[col] = df[col].map(lambda x: int(clean_numeric(x)) if clean_numeric(x) is not None else None)
-                else:
-                    df[col] = None
-
-            for col in ["emnt", "emxt", "tavg", "tmax", "tmin"]:
-                if col in df.columns:
-                    df[col] = df[col].map(clean_numeric)
-                else:
-                    df[col] = None
-
-            # Celsius conversions
-            df["tavg_c"] = df["tavg"].map(f_to_c)
-            df["tmax_c"] = df["tmax"].map(f_to_c)
-            df["tmin_c"] = df["tmin"].map(f_to_c)
-
-            df["file_name"] = csv_path.name
-
-            # Keep only columns required by SQL
-            INSERT_COLUMNS = [
-                "station_id","station_name","date_month",
-                "cdsd","emnt","emxt","hdsd","tavg","tmax","tmin",
-                "tavg_c","tmax_c","tmin_c",
-                "file_name"
-            ]
-
-            df = df[INSERT_COLUMNS]
-
-            # Drop rows missing date or station_id
-            df = df[df["date_month"].notnull()]
-            df = df[df["station_id"].notnull()]
-
-            # Convert to Python objects
-            df = df.replace({np.nan: None})
-            records = df.values.tolist()
-            total = len(records)
-
-            print(f"Prepared {total} clean rows from {csv_path.name}")
-
-            # UPSERT logic — prevents duplicates
-            placeholders = ", ".join(["%s"] * len(INSERT_COLUMNS))
-            col_list = ", ".join(f"`{c}`" for c in INSERT_COLUMNS)
-            update_list = ", ".join(f"{c}=VALUES({c})" for c in INSERT_COLUMNS if c not in {"station_id","date_month"})
-
-            insert_sql = f"""
-                INSERT INTO {TABLE} ({col_list})
-                VALUES ({placeholders})
-                ON DUPLICATE KEY UPDATE
-                {update_list}
-            """
-
-            # Insert
-            batches = math.ceil(total / BATCH_SIZE)
-            start = 0
-            for batch_num in range(batches):
-                end = min(start + BATCH_SIZE, total)
-                batch = records[start:end]
-                print(f"Inserting rows {start}..{end-1}")
-
-                try:
-                    cur.executemany(insert_sql, batch)
-                    cnx.commit()
-                except Exception as e:
-                    cnx.rollback()
-                    print(f"FAILED during {csv_path.name} batch {batch_num+1}: {e}")
-                    raise
-
-                start = end
+            total = upsert_file(cnx, cur, ins, packet, csv_path, chunks)
+            done += 1
+            print(f"Imported {total} clean rows from {csv_path.name}")
 
         print("\n All CSVs imported successfully.")
 
@@ -169,10 +183,21 @@ def main():
         raise
 
     finally:
-        try: cur.close()
-        except: pass
-        try: cnx.close()
-        except: pass
+        if done < len(csv_files):
+            # Files before the failed one stay committed; it was rolled back
+            print(f"Stopped at {csv_files[done].name}: {done} of {len(csv_files)} file(s) committed, "
+                  f"the rest not loaded")
+        # Only restore and close what was actually opened
+        if ins is not None:
+            ins.close()
+        if cur is not None:
+            try:
+                restore_session(cur)
+            except mysql.connector.Error:
+                pass
+            cur.close()
+        if cnx is not None:
+            cnx.close()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,121 @@
+import math
+import re
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# The ingest scripts live flat in the repo root
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+# String columns the transforms see: object from pandas' C engine, Arrow from pyarrow
+STRING_DTYPES = ["object"]
+try:
+    import pyarrow as pa
+    STRING_DTYPES.append(pd.ArrowDtype(pa.string()))
+except ImportError:
+    pass
+
+
+def as_series(values, dtype):
+    if dtype != "object":  # Arrow string arrays take None, not float NaN, for a null
+        values = [None if v is np.nan else v for v in values]
+    return pd.Series(values, dtype=dtype)
+
+
+def plain(values):
+    """NaN / NA / None all compare as None; numbers as float"""
+    out = []
+    for v in values:
+        if v is None or v is pd.NA or v is pd.NaT or (isinstance(v, float) and math.isnan(v)):
+            out.append(None)
+        elif isinstance(v, (int, float, np.integer, np.floating)):
+            out.append(float(v))
+        else:
+            out.append(v)
+    return out
+
+
+class FakeCursor:
+    """Stands in for a mysql-connector cursor: records what is executed.
+
+    `statements` keeps every (sql, params) pair; a LOAD DATA LOCAL INFILE's
+    temp file is read into `loaded` while it still exists. fetchone()
+    answers the few queries the ingests read back, fetchall() returns
+    `fetchall_rows`.
+    """
+
+    def __init__(self, fetchall_rows=()):
+        self.statements = []
+        self.loaded = []
+        self.fetchall_rows = list(fetchall_rows)
+        self._last = ""
+
+    def execute(self, sql, params=None):
+        self.statements.append((sql, params))
+        self._last = sql
+        if sql.startswith("LOAD DATA LOCAL INFILE"):
+            self.loaded.append(Path(params[0]).read_text(encoding="utf-8"))
+
+    def fetchone(self):
+        if "@@max_allowed_packet" in self._last:
+            return (64 * 1024 * 1024,)
+        if "COUNT(*)" in self._last:
+            return (len(self.inserted_rows()),)
+        if "MAX(" in self._last:
+            return (1.0, 1.0)
+        return None
+
+    def fetchall(self):
+        return self.fetchall_rows
+
+    def inserted_rows(self):
+        """Rows sent by multi-row INSERTs, in the order they went out."""
+        rows = []
+        for sql, params in self.statements:
+            m = re.match(r"INSERT INTO \S+ \(([^)]*)\) VALUES", sql)
+            if m:
+                width = len(m.group(1).split(","))
+                rows += [tuple(params[i:i + width]) for i in range(0, len(params), width)]
+        return rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """mysql.connector.connect() stand-in; every cursor it hands out is kept."""
+
+    def __init__(self):
+        self.cursors = []
+        self.commits = 0
+        self.rollbacks = 0
+
+    def cursor(self, prepared=False):
+        cur = FakeCursor()
+        self.cursors.append(cur)
+        return cur
+
+    def inserted_rows(self):
+        return [row for cur in self.cursors for row in cur.inserted_rows()]
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def fake_cnx(monkeypatch):
+    """Patch mysql.connector.connect to hand out one FakeConnection."""
+    connector = pytest.importorskip("mysql.connector")
+    cnx = FakeConnection()
+    monkeypatch.setattr(connector, "connect", lambda *args, **kwargs: cnx)
+    return cnx
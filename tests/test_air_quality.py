@@ -0,0 +1,58 @@
+# ===== AIR QUALITY BOROUGH / GEO LEVEL: ONCE PER NAME vs THE ORIGINAL PER-ROW VERSIONS ===== #
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("mysql.connector")  # the script imports the driver at module level
+
+import ingest_csv_to_mysql_air_quality as air
+from conftest import STRING_DTYPES, as_series
+
+
+def old_infer_borough(name):
+    if not isinstance(name, str) or not name.strip():
+        return "Unknown"
+    n = name.lower().strip()
+    for key, borough in air.BOROUGH_MAP_SECONDARY.items():
+        if key in n:
+            return borough
+    for borough, keywords in air.BOROUGH_KEYWORDS.items():
+        if any(k in n for k in keywords):
+            return borough
+    return "Unknown"
+
+def old_infer_geo_level(name):
+    if not isinstance(name, str) or not name.strip():
+        return "Unknown"
+    clean = name.lower().strip()
+    if clean in ["bronx", "brooklyn", "queens", "manhattan", "staten island"]:
+        return "Borough"
+    return "Neighborhood"
+
+
+PLACES = [
+    "Washington Heights", "Morris Heights", "Park Slope", "East New York and Starrett City",
+    "Coney Island - Sheepshead Bay", "Greenwich Village - SoHo", "Upper West Side",
+    "Jamaica", "Far Rockaway", "Rockaways", "Southern SI", "South Beach - Tottenville",
+    "Bronx", " brooklyn ", "QUEENS", "Manhattan", "Staten Island", "New York City",
+    "Hunts Point - Mott Haven", "Long Island City - Astoria", "Somewhere", "", "   ", np.nan,
+]
+
+
+@pytest.mark.parametrize("dtype", STRING_DTYPES, ids=str)
+@pytest.mark.parametrize("use_automaton", [True, False], ids=["automaton", "regex"])
+def test_borough_and_geo_level_match_per_row(monkeypatch, dtype, use_automaton):
+    if use_automaton and air.BOROUGH_AUTOMATON is None:
+        pytest.skip("pyahocorasick not installed")
+    if not use_automaton:
+        monkeypatch.setattr(air, "BOROUGH_AUTOMATON", None)
+
+    place_lower = as_series(PLACES, dtype).str.lower().str.strip()
+    codes, names = pd.factorize(place_lower)
+    names = pd.Series(names)
+    borough = air.by_place(codes, air.infer_borough(names), "Unknown")
+    geo_level = air.by_place(codes, air.infer_geo_level(names), "Unknown")
+
+    assert list(borough) == [old_infer_borough(p) for p in PLACES]
+    assert list(geo_level) == [old_infer_geo_level(p) for p in PLACES]
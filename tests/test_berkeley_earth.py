@@ -0,0 +1,76 @@
+# ===== BERKELEY EARTH INGEST: ROWS SENT FOR A SMALL FILE IN THE REAL LAYOUT ===== #
+
+import math
+
+import pytest
+
+pytest.importorskip("mysql.connector")  # the script imports the driver at module level
+
+import ingest_csv_to_mysql_berkeley_earth_temperature_data as berkeley
+
+PREAMBLE = "% Berkeley Earth North America\n% Year, Month, anomalies and uncertainties\n\n"
+# The real header repeats "Anomaly" / "Unc." for every smoothing window
+HEADER = "Year,Month" + ",Anomaly,Unc." * 5
+ROWS = [
+    "1850,1,-0.5,0.1,0.2,0.05,NaN,,0.1,0.01,0.0,0.01",
+    "1850,2,0.75,0.2,abc,0.05,0.3,0.1,0.1,0.01,0.0,0.01",
+    "1850,13,1.0,0.1,0.2,0.05,0.3,0.1,0.1,0.01,0.0,0.01",  # no baseline for month 13
+    "1851,7, 1.25 ,0.1",                                   # short row: the rest is missing
+    ",,,,,,,,,,,",                                         # no year / month: dropped
+]
+
+
+def old_rows(file_name):
+    """Per-row version of the original script's math, straight off ROWS"""
+    parsed = []
+    for line in ROWS:
+        cells = (line.split(",") + [""] * 12)[:12]
+        vals = []
+        for c in cells:
+            try:
+                vals.append(float(c))
+            except ValueError:
+                vals.append(math.nan)
+        if math.isnan(vals[0]) or math.isnan(vals[1]):
+            continue
+        parsed.append(vals)
+
+    out = []
+    for vals in parsed:
+        year, month, monthly = vals[0], vals[1], vals[2]
+        base = berkeley.MONTH_BASELINES.get(int(month))
+        abs_monthly = base + monthly if base is not None else math.nan
+        smoothed = [berkeley.BASELINE_GLOBAL + vals[i] for i in (4, 6, 8, 10)]
+        same_year = [berkeley.MONTH_BASELINES.get(int(v[1]), math.nan) + v[2] for v in parsed if v[0] == year]
+        same_year = [t for t in same_year if not math.isnan(t)]
+        yearly = sum(same_year) / len(same_year) if same_year else math.nan
+        temps = [abs_monthly, *smoothed, yearly]
+        out.append(vals + temps + [t * 9 / 5 + 32 for t in temps] + [file_name])
+    return out
+
+
+def same(a, b):
+    if isinstance(a, str) or isinstance(b, str):
+        return a == b
+    if a is None or b is None or math.isnan(b) or math.isnan(a):
+        return (a is None or math.isnan(a)) and (b is None or math.isnan(b))
+    return math.isclose(a, b, rel_tol=1e-12, abs_tol=1e-12)
+
+
+@pytest.mark.parametrize("batch_size", [2, 10000])
+def test_main_sends_the_computed_rows(fake_cnx, tmp_path, monkeypatch, batch_size):
+    csv_path = tmp_path / "berkeley.csv"
+    csv_path.write_text(PREAMBLE + HEADER + "\n" + "\n".join(ROWS) + "\n")
+    monkeypatch.setattr(berkeley, "CSV_PATH", csv_path)
+    monkeypatch.setattr(berkeley, "FILE_NAME_FOR_PROVENANCE", csv_path.name)
+    monkeypatch.setattr(berkeley, "BATCH_SIZE", batch_size)
+    berkeley.main()
+
+    sent = fake_cnx.inserted_rows()
+    expected = old_rows(csv_path.name)
+    assert len(sent) == len(expected) == 4
+    for got, want in zip(sent, expected):
+        assert len(got) == len(berkeley.INSERT_COLUMNS)
+        assert all(same(g, w) for g, w in zip(got, want)), (got, want)
+        assert not any(isinstance(v, float) and math.isnan(v) for v in got)  # NaN goes out as NULL
+    assert fake_cnx.commits == 1
@@ -0,0 +1,211 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import ingest_helpers
+from ingest_helpers import (MAX_PLACEHOLDERS, NA_VALUES, bulk_insert, drop_indexes, load_data_local,
+                            read_csv_chunks, read_csv_frame, rebuild_indexes)
+from conftest import FakeCursor
+
+ENGINES = ["c", pytest.param("pyarrow", marks=pytest.mark.skipif(
+    ingest_helpers.ENGINE != "pyarrow", reason="pyarrow not installed"))]
+
+
+@pytest.fixture(params=ENGINES)
+def engine(request, monkeypatch):
+    monkeypatch.setattr(ingest_helpers, "ENGINE", request.param)
+    return request.param
+
+
+def as_objects(df):
+    """Values as plain Python objects, missing as None, for engine-independent compares"""
+    return df.astype(object).to_numpy(dtype=object, na_value=None).tolist()
+
+
+# ---- bulk_insert ----
+def test_bulk_insert_sends_full_batches_then_the_tail_with_suffix():
+    cur = FakeCursor()
+    rows = [(i, f"name {i}") for i in range(10)]
+    sent = bulk_insert(cur, "t", ["id", "name"], rows, batch=4, suffix=" ON DUPLICATE KEY UPDATE name=VALUES(name)")
+
+    assert sent == 10
+    assert cur.inserted_rows() == rows
+    sqls = [sql for sql, _ in cur.statements]
+    assert [sql.count("(%s, %s)") for sql in sqls] == [4, 4, 2]
+    assert all(sql.startswith("INSERT INTO t (`id`, `name`) VALUES ") for sql in sqls)
+    assert all(sql.endswith(" ON DUPLICATE KEY UPDATE name=VALUES(name)") for sql in sqls)
+    # Full batches get the very same string back (what lets a prepared cursor reuse its plan)
+    assert sqls[0] is sqls[1]
+
+
+def test_bulk_insert_caps_rows_per_statement_at_the_placeholder_limit():
+    cur = FakeCursor()
+    columns = ["a", "b", "c"]
+    rows = [(i, i, i) for i in range(50000)]
+    bulk_insert(cur, "t", columns, rows, batch=50000)
+
+    per_stmt = MAX_PLACEHOLDERS // len(columns)
+    assert [len(params) // 3 for _, params in cur.statements] == [per_stmt, per_stmt, 50000 - 2 * per_stmt]
+    assert cur.inserted_rows() == rows
+
+
+def test_bulk_insert_shrinks_batches_to_fit_half_a_packet():
+    cur = FakeCursor()
+    rows = [(i, "x" * 100) for i in range(40)]
+    bulk_insert(cur, "t", ["id", "payload"], rows, batch=1000, max_packet=2000)
+
+    widest = max(ingest_helpers._row_bytes(r) for r in rows)
+    sizes = [len(params) // 2 for _, params in cur.statements]
+    assert max(sizes) == 2000 // (2 * widest)
+    assert sum(sizes) == 40
+    assert cur.inserted_rows() == rows
+
+
+def test_bulk_insert_with_no_rows_sends_nothing():
+    cur = FakeCursor()
+    assert bulk_insert(cur, "t", ["a"], iter([]), max_packet=2000) == 0
+    assert cur.statements == []
+
+
+# ---- read_csv_chunks / read_csv_frame ----
+def write_csv(tmp_path, text, name="data.csv"):
+    path = tmp_path / name
+    path.write_text(text, encoding="utf-8")
+    return path
+
+
+@pytest.fixture
+def census_csv(tmp_path):
+    lines = ["tree_id,spc_common,notes"]
+    for i in range(50):
+        lines.append(f'{i},{["oak", "NA", "", " maple ", "N/A"][i % 5]},"line one\nline {i}"')
+    return write_csv(tmp_path, "\n".join(lines) + "\n")
+
+
+def test_read_csv_chunks_yields_chunksize_rows_with_pandas_values(engine, census_csv):
+    chunks = list(read_csv_chunks(census_csv, 7))
+
+    assert [len(c) for c in chunks] == [7] * 7 + [1]
+    expected = pd.read_csv(census_csv, dtype=str, keep_default_na=True, na_values=NA_VALUES)
+    assert as_objects(pd.concat(chunks)) == as_objects(expected)
+    assert list(chunks[0].columns) == ["tree_id", "spc_common", "notes"]
+
+
+@pytest.mark.skipif(ingest_helpers.ENGINE != "pyarrow", reason="pyarrow not installed")
+def test_read_csv_chunks_collects_small_record_batches_into_chunks(monkeypatch, census_csv):
+    # Tiny Arrow blocks: each record batch holds fewer rows than a chunk
+    arrow_options = ingest_helpers._arrow_csv_options
+
+    def small_blocks(*args, **kwargs):
+        options = arrow_options(*args, **kwargs)
+        options["read_options"].block_size = 64
+        return options
+
+    monkeypatch.setattr(ingest_helpers, "_arrow_csv_options", small_blocks)
+    chunks = list(read_csv_chunks(census_csv, 7))
+
+    assert [len(c) for c in chunks] == [7] * 7 + [1]
+    expected = pd.read_csv(census_csv, dtype=str, keep_default_na=True, na_values=NA_VALUES)
+    assert as_objects(pd.concat(chunks)) == as_objects(expected)
+
+
+BERKELEY_LIKE = (
+    "% preamble, with commas\n"
+    "Year,Month,Anomaly,Unc.,Anomaly,Unc.\n"
+    "1850,1,-0.5,0.1,NaN,\n"
+    "1850,2, 0.25 ,0.2,0.3,0.04\n"
+)
+
+
+def test_read_csv_frame_names_duplicate_headers_by_position(engine, tmp_path):
+    path = write_csv(tmp_path, BERKELEY_LIKE)
+    df = read_csv_frame(path, skip_rows=1, names=["year", "month", "a", "a_unc"])
+
+    assert list(df.columns) == ["year", "month", "a", "a_unc"]
+    assert as_objects(df) == [["1850", "1", "-0.5", "0.1"], ["1850", "2", " 0.25 ", "0.2"]]
+
+
+def test_read_csv_frame_numeric_parses_floats(engine, tmp_path):
+    path = write_csv(tmp_path, BERKELEY_LIKE)
+    df = read_csv_frame(path, skip_rows=1, names=["year", "month", "a", "a_unc", "b", "b_unc"], numeric=True)
+
+    assert (df.dtypes == "float64").all()
+    assert as_objects(df) == [[1850.0, 1.0, -0.5, 0.1, None, None], [1850.0, 2.0, 0.25, 0.2, 0.3, 0.04]]
+
+
+@pytest.mark.parametrize("text, expected", [
+    # A short row: pyarrow rejects it, pandas pads it with NaN
+    ("Year,Month,Anomaly\n1850,1,0.5\n1850\n", [[1850.0, 1.0, 0.5], [1850.0, None, None]]),
+    # Text in a numeric read: pyarrow rejects the column, pandas' to_numeric makes it NaN
+    ("Year,Month,Anomaly\n1850,1,abc\n1850,2,0.5\n", [[1850.0, 1.0, None], [1850.0, 2.0, 0.5]]),
+])
+def test_read_csv_frame_falls_back_to_pandas_for_what_pyarrow_rejects(engine, tmp_path, text, expected):
+    path = write_csv(tmp_path, text)
+    df = read_csv_frame(path, names=["year", "month", "anomaly"], numeric=True)
+
+    assert (df.dtypes == "float64").all()
+    assert as_objects(df) == expected
+
+
+# ---- load_data_local ----
+def test_load_data_local_writes_nulls_and_quotes_to_the_temp_csv():
+    cur = FakeCursor()
+    df = pd.DataFrame({
+        "id": pd.array([1, None, 3], dtype="Int64"),
+        "name": ["plain", 'say "hi", twice', None],
+        "value": [1.5, np.nan, 2.0],
+    })
+    load_data_local(cur, "t", ["id", "name", "value"], df)
+
+    sql, params = cur.statements[0]
+    assert sql.startswith("LOAD DATA LOCAL INFILE %s INTO TABLE t ")
+    assert sql.endswith("(`id`, `name`, `value`)")
+    assert cur.loaded == ['1,plain,1.5\nNULL,"say ""hi"", twice",NULL\n3,NULL,2.0\n']
+    assert not __import__("os").path.exists(params[0])  # temp file is removed
+
+
+# ---- drop_indexes / rebuild_indexes ----
+STATISTICS = [
+    # INDEX_NAME, NON_UNIQUE, INDEX_TYPE, COLUMN_NAME, SUB_PART, COLLATION
+    ("PRIMARY", 0, "BTREE", "id", None, "A"),
+    ("idx_zip_name", 1, "BTREE", "zip", None, "A"),
+    ("idx_zip_name", 1, "BTREE", "name", 10, "D"),
+    ("ft_notes", 1, "FULLTEXT", "notes", None, None),
+    ("uq_tree", 0, "BTREE", "tree_id", None, "A"),
+    ("fn_lower", 1, "BTREE", None, None, "A"),
+]
+
+
+def test_drop_indexes_returns_their_definitions_for_rebuild():
+    cur = FakeCursor(fetchall_rows=STATISTICS)
+    dropped = drop_indexes(cur, "t", ("idx_zip_name", "ft_notes"))
+
+    assert dropped == {
+        "idx_zip_name": "ADD INDEX `idx_zip_name` (`zip`, `name`(10) DESC)",
+        "ft_notes": "ADD FULLTEXT INDEX `ft_notes` (`notes`)",
+    }
+    assert cur.statements[-1][0] == "ALTER TABLE t DROP INDEX `idx_zip_name`, DROP INDEX `ft_notes`"
+
+    rebuild_indexes(cur, "t", dropped)
+    assert cur.statements[-1][0] == ("ALTER TABLE t ADD INDEX `idx_zip_name` (`zip`, `name`(10) DESC), "
+                                     "ADD FULLTEXT INDEX `ft_notes` (`notes`)")
+
+
+@pytest.mark.parametrize("names, message", [
+    (("uq_tree",), "UNIQUE"),
+    (("PRIMARY",), "UNIQUE"),
+    (("fn_lower",), "functional"),
+    (("idx_zip_name", "nope"), "No such index"),
+])
+def test_drop_indexes_refuses_before_dropping_anything(names, message):
+    cur = FakeCursor(fetchall_rows=STATISTICS)
+    with pytest.raises(ValueError, match=message):
+        drop_indexes(cur, "t", names)
+    assert not any(sql.startswith("ALTER TABLE") for sql, _ in cur.statements)
+
+
+def test_no_indexes_to_drop_means_no_statements():
+    cur = FakeCursor()
+    assert drop_indexes(cur, "t", ()) == {}
+    rebuild_indexes(cur, "t", {})
+    assert cur.statements == []
@@ -0,0 +1,109 @@
+# ===== TREE CENSUS CONVERTERS: COLUMN-WISE vs THE ORIGINAL PER-ROW VERSIONS ===== #
+# The old_* functions are the per-cell converters the scripts used before
+# the column-wise rewrites; the new ones must give the same values.
+
+import re
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+pytest.importorskip("mysql.connector")  # the scripts import the driver at module level
+
+import ingest_csv_to_mysql_1995 as census_1995
+import ingest_csv_to_mysql_2005 as census_2005
+import ingest_csv_to_mysql_2015 as census_2015
+from conftest import STRING_DTYPES, as_series, plain
+
+# What read_csv(dtype=str) hands the converters: strings, with NaN for missing cells
+RAW = [
+    "1", " 12 ", "1,234", "-4", "0", "400", "401", "3.5", "1e3", "1,000.5", " -73.9 ",
+    "inf", "-Infinity", "NAN", "nan", "abc", "x", "", "   ",
+    "Yes", "No", "Y", "n", " t ", "F", "true", "maybe",
+    "Excellent", " good ", "FAIR", "Poor", "dead", "e", "g", "p", "d", "f", "Unknown",
+    np.nan,
+]
+
+
+def old_to_bool(s):
+    if s is None: return None
+    t = str(s).strip().lower()
+    if t in {"y","yes","1","true","t"}: return 1
+    if t in {"n","no","0","false","f"}: return 0
+    return None
+
+def old_to_int(s):
+    if s is None: return None
+    t = re.sub(r"[,\s]", "", str(s))
+    return int(t) if t != "" and re.fullmatch(r"-?\d+", t) else None
+
+def old_to_int_bounded(s, low=0, high=400):
+    v = old_to_int(s)
+    if v is None: return None
+    return v if (low <= v <= high) else None
+
+def old_to_dec(s):
+    if s is None: return None
+    t = re.sub(r"[,\s]", "", str(s))
+    try:
+        return float(t) if t != "" else None
+    except ValueError:
+        return None
+
+def old_health_3cat(s):
+    if s is None: return None
+    t = str(s).strip().lower()
+    if t in {"excellent", "e"}: return "Good"
+    if t in {"good", "g"}:     return "Fair"
+    if t in {"poor", "p", "dead", "d", "fair", "f"}: return "Poor"
+    return None
+
+def old_to_iso_date(s):
+    if s is None: return None
+    t = str(s).strip()
+    if t == "" or t.lower() in {"na", "n/a", "null"}:
+        return None
+    for fmt in ("%Y-%m-%d", "%m/%d/%Y", "%m/%d/%y", "%m-%d-%Y", "%m-%d-%y"):
+        try:
+            return datetime.strptime(t, fmt).date().isoformat()
+        except ValueError:
+            continue
+    return None
+
+
+@pytest.mark.parametrize("dtype", STRING_DTYPES, ids=str)
+@pytest.mark.parametrize("module", [census_1995, census_2005], ids=["1995", "2005"])
+@pytest.mark.parametrize("new, old", [
+    ("to_bool", old_to_bool),
+    ("to_int", old_to_int),
+    ("to_int_bounded", old_to_int_bounded),
+    ("to_dec", old_to_dec),
+])
+def test_converters_match_per_row(module, new, old, dtype):
+    got = getattr(module, new)(as_series(RAW, dtype))
+    assert plain(got.tolist()) == plain([old(v) for v in RAW])
+
+
+@pytest.mark.parametrize("dtype", STRING_DTYPES, ids=str)
+def test_2005_to_year_matches_to_int(dtype):
+    got = census_2005.to_year(as_series(RAW, dtype))
+    assert plain(got.tolist()) == plain([old_to_int(v) for v in RAW])
+
+
+@pytest.mark.parametrize("dtype", STRING_DTYPES, ids=str)
+@pytest.mark.parametrize("module", [census_1995, census_2005], ids=["1995", "2005"])
+def test_health_map_matches_per_row(module, dtype):
+    got = as_series(RAW, dtype).str.strip().str.lower().map(module.HEALTH_MAP)
+    assert plain(got.tolist()) == plain([old_health_3cat(v) for v in RAW])
+
+
+DATES = [
+    "2015-08-27", "08/27/2015", "8/27/15", "08-27-2015", "8-27-15", " 2015-8-27 ",
+    "12/31/99", "02/30/2015", "2015/08/27", "27/08/2015", "today", "now", "NA", "", np.nan,
+]
+
+
+@pytest.mark.parametrize("dtype", STRING_DTYPES, ids=str)
+def test_2015_to_iso_date_matches_per_row(dtype):
+    got = census_2015.to_iso_date(as_series(DATES, dtype))
+    assert plain(got.tolist()) == plain([old_to_iso_date(v) for v in DATES])
@@ -0,0 +1,110 @@
+# ===== NOAA MONTHLY INGEST: CLEANED ROWS AND WHICH FILE'S ROW A SHARED KEY KEEPS ===== #
+
+import math
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("mysql.connector")  # the script imports the driver at module level
+
+import ingest_monthly_temp_data_2022_to_2024 as monthly
+from conftest import plain
+
+
+# ---- the original per-row cleaning ----
+def old_to_date_month(s):
+    try:
+        return datetime.strptime(s.strip(), "%Y-%m").strftime("%Y-%m-01")
+    except ValueError:
+        return None
+
+def old_clean_numeric(val):
+    val = str(val).strip()
+    if val == "" or val.lower() in {"nan", "na", "null"}:
+        return None
+    try:
+        return float(val)
+    except ValueError:
+        return None
+
+def old_f_to_c(f):
+    return None if f is None else (f - 32) * 5.0 / 9.0
+
+def old_row(raw, file_name):
+    raw = {k.strip().lower(): v for k, v in raw.items()}
+    num = {c: old_clean_numeric(raw.get(c, "")) for c in monthly.NUMERIC_COLUMNS}
+    for c in ("cdsd", "hdsd"):
+        num[c] = int(num[c]) if num[c] is not None else None
+    return [raw["station"], raw["name"], old_to_date_month(raw["date"]),
+            num["cdsd"], num["emnt"], num["emxt"], num["hdsd"], num["tavg"], num["tmax"], num["tmin"],
+            old_f_to_c(num["tavg"]), old_f_to_c(num["tmax"]), old_f_to_c(num["tmin"]), file_name]
+
+
+HEADER = ["STATION", "NAME", "DATE", "CDSD", "HDSD", "TAVG", "TMAX", "TMIN", "EMNT", "EMXT"]
+RAW_ROWS = [
+    ["USW2", "CENTRAL PARK", "2023-07", "12.7", "0", "77.1", "85", "70", "60", "95"],
+    ["USW1", "LAGUARDIA", "2023-7", " 5 ", "", "nan", "x", "NA", "", "1e2"],
+    ["USW2", "CENTRAL PARK", "2023-01", "", "812.9", "33.5", "40", "27", "10", "55"],
+    ["USW1", "LAGUARDIA", "bad", "1", "1", "1", "1", "1", "1", "1"],
+    ["USW1", "LAGUARDIA", "now", "1", "1", "1", "1", "1", "1", "1"],
+    ["USW2", "CENTRAL PARK", "2023-07", "13", "1", "78", "86", "71", "61", "96"],  # repeats a key
+    ["USW1", "LAGUARDIA", "2022-12", "0", "900", "30", "38", "25", "5", "50"],
+]
+
+
+def chunk(rows, header=HEADER):
+    return pd.DataFrame(rows, columns=header, dtype=str)
+
+
+def test_transform_matches_per_row_cleaning_in_key_order():
+    got = monthly.transform(chunk(RAW_ROWS), "w.csv")
+
+    expected = [old_row(dict(zip(HEADER, r)), "w.csv") for r in RAW_ROWS]
+    expected = [r for r in expected if r[2] is not None]
+    # Stable sort on (station_id, date_month): a repeated key keeps its file order
+    expected.sort(key=lambda r: (r[0], r[2]))
+    assert list(got.columns) == monthly.INSERT_COLUMNS
+    assert [plain(r) for r in got.to_numpy(dtype=object, na_value=None).tolist()] == \
+           [plain(r) for r in expected]
+
+
+def test_transform_fills_missing_numeric_columns_with_null():
+    got = monthly.transform(chunk([["USW1", "LAGUARDIA", "2024-03", "70"]], ["STATION", "NAME", "DATE", "TAVG"]),
+                            "w.csv")
+    row = got.to_numpy(dtype=object, na_value=None).tolist()[0]
+    assert row[:4] == ["USW1", "LAGUARDIA", "2024-03-01", None]
+    assert math.isclose(row[monthly.INSERT_COLUMNS.index("tavg_c")], (70 - 32) * 5 / 9)
+
+
+def write_weather(tmp_path, files):
+    for name, rows in files.items():
+        text = "\n".join([",".join(HEADER)] + [",".join(r) for r in rows]) + "\n"
+        (tmp_path / name).write_text(text)
+    return tmp_path
+
+
+def test_a_key_shared_by_several_files_keeps_the_last_files_row(fake_cnx, tmp_path, monkeypatch):
+    monkeypatch.setattr(monthly, "BATCH_SIZE", 3)
+    rows = [["USW1", "LAGUARDIA", f"2023-{m:02d}", "1", "1", "1", "1", "1", "1", "1"] for m in range(1, 8)]
+    # f0 is the biggest, so it is the last one a parallel upsert would finish
+    csv_dir = write_weather(tmp_path, {"f0.csv": rows * 20, "f1.csv": rows[:4], "f2.csv": rows[2:3]})
+    monthly.main(csv_dir=csv_dir)
+
+    stored = {}
+    for row in fake_cnx.inserted_rows():  # ON DUPLICATE KEY UPDATE: the latest row wins
+        stored[(row[0], row[2])] = row[-1]
+    assert stored == {("USW1", f"2023-{m:02d}-01"): {3: "f2.csv"}.get(m, "f1.csv" if m < 5 else "f0.csv")
+                      for m in range(1, 8)}
+    assert fake_cnx.commits == 3  # one per file
+
+
+def test_a_failed_file_stops_the_run_and_keeps_earlier_files(fake_cnx, tmp_path, capsys):
+    csv_dir = write_weather(tmp_path, {"f0.csv": RAW_ROWS})
+    (csv_dir / "f1.csv").write_text("STATION,NAME\nUSW1,LAGUARDIA\n")  # no DATE column
+    with pytest.raises(ValueError, match="Column 'date' missing in f1.csv"):
+        monthly.main(csv_dir=csv_dir)
+
+    assert fake_cnx.commits == 1
+    assert {row[-1] for row in fake_cnx.inserted_rows()} == {"f0.csv"}
+    assert "Stopped at f1.csv: 1 of 2 file(s) committed" in capsys.readouterr().out